@@ -1,4 +1,23 @@
 from .version import version, version_info
-from .client import OrbitDbAPI
-from .db import DB
 __version__ = version
+
+# Clients are imported on first access so `import orbitdbapi` stays cheap
+_lazy_attributes = {
+    'OrbitDbAPI': '.client',
+    'DB': '.db',
+    'Entry': '.entry'
+}
+
+
+def __getattr__(name):
+    module = _lazy_attributes.get(name)
+    if module is None:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    from importlib import import_module
+    value = getattr(import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted([*globals(), *_lazy_attributes])
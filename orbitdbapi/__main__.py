@@ -0,0 +1,179 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import string
+import sys
+import time
+
+from .asyncClient import OrbitDbAPI
+from .trace import replay_arguments, run_replay
+
+
+class RateLimiter():
+    def __init__(self, rate=None):
+        self.__interval = 1 / rate if rate else 0
+        self.__next = 0
+
+    async def wait(self):
+        if not self.__interval: return
+        now = time.monotonic()
+        slot = max(self.__next, now)
+        self.__next = slot + self.__interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+def percentile(ordered, pct):
+    if not ordered: return 0
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def report(name, latencies, elapsed, errors):
+    ordered = sorted(latencies)
+    rate = len(ordered) / elapsed if elapsed else 0
+    print(
+        f'{name}: {len(ordered)} ok, {errors} failed in {elapsed:.2f}s ({rate:.1f} ops/s) '
+        f'p50={percentile(ordered, 50) * 1000:.1f}ms p90={percentile(ordered, 90) * 1000:.1f}ms '
+        f'p99={percentile(ordered, 99) * 1000:.1f}ms max={percentile(ordered, 100) * 1000:.1f}ms'
+    )
+
+
+async def run_workers(tasks, concurrency, rate):
+    # Pulls (name, coroutine function) pairs from tasks with at most concurrency in flight
+    limiter = RateLimiter(rate)
+    latencies = {}
+    errors = {}
+    tasks = iter(tasks)
+
+    async def worker():
+        for name, fn in tasks:
+            await limiter.wait()
+            started = time.perf_counter()
+            try:
+                await fn()
+            except Exception:
+                errors[name] = errors.get(name, 0) + 1
+                logging.getLogger(__name__).debug(f'{name} failed', exc_info=True)
+            else:
+                latencies.setdefault(name, []).append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _c in range(concurrency)])
+    elapsed = time.perf_counter() - started
+    for name in sorted(set(latencies) | set(errors)):
+        report(name, latencies.get(name, []), elapsed, errors.get(name, 0))
+    return sum(errors.values())
+
+
+def open_options(args):
+    if not args.type: return {}
+    return {'json': {'create': True, 'type': args.type}}
+
+
+async def load(client, args):
+    db = await client.db(args.dbname, **open_options(args))
+    write = db.add if args.op == 'add' else db.put
+
+    def tasks():
+        with open(args.file, encoding='utf-8') as fp:
+            for line in fp:
+                if not line.strip(): continue
+                item = json.loads(line)
+                yield args.op, lambda item=item: write(item, cache=False)
+    return await run_workers(tasks(), args.concurrency, args.rate)
+
+
+async def dump(client, args):
+    db = await client.db(args.dbname, **open_options(args))
+    started = time.perf_counter()
+    with open(args.file, 'wb') as fp:
+        if db.iterable:
+            size = await db.iterator_raw(sink=fp, limit=-1)
+        else:
+            size = await db.all(sink=fp)
+    print(f'Wrote {size} bytes to {args.file} in {time.perf_counter() - started:.2f}s')
+    return 0
+
+
+async def bench(client, args):
+    db = await client.db(args.dbname, **open_options(args))
+    value = ''.join(random.choices(string.ascii_letters + string.digits, k=args.value_size))
+    keys = [f'bench-{n}' for n in range(args.keys)]
+
+    def write(key):
+        if db.addable: return 'add', lambda: db.add({'value': value}, cache=False)
+        if db.incrementable: return 'inc', lambda: db.inc(1)
+        return 'put', lambda key=key: db.put({'key': key, db.index_by or '_id': key, 'value': value}, cache=False)
+
+    def read(key):
+        if db.valuable: return 'value', db.value
+        if db.iterable: return 'iterator', lambda: db.iterator(limit=1)
+        return 'get', lambda key=key: db.get(key, cache=False)
+
+    def tasks():
+        for _c in range(args.ops):
+            key = random.choice(keys)
+            yield read(key) if random.random() < args.read_ratio else write(key)
+    return await run_workers(tasks(), args.concurrency, args.rate)
+
+
+def parser():
+    parser = argparse.ArgumentParser(prog='python -m orbitdbapi', description='Bulk tools for an orbit-db-http-api node')
+    parser.add_argument('--base-url', default=os.environ.get('ORBIT_DB_HTTP_API_URL'), help='Defaults to $ORBIT_DB_HTTP_API_URL')
+    parser.add_argument('--timeout', type=float, default=float(os.environ.get('ORBIT_DB_HTTP_API_TIMEOUT', 30)))
+    parser.add_argument('--log-level', default='WARNING')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    def db_command(name, help):
+        command = commands.add_parser(name, help=help)
+        command.add_argument('dbname', help='Db name or address')
+        command.add_argument('--type', help='Create the db with this type if it does not exist')
+        return command
+
+    def worker_options(command, concurrency):
+        command.add_argument('--concurrency', type=int, default=concurrency, help='Requests in flight')
+        command.add_argument('--rate', type=float, help='Maximum requests per second')
+
+    command = db_command('load', 'Bulk put/add items from a JSON-lines file')
+    command.add_argument('file')
+    command.add_argument('--op', choices=['put', 'add'], default='put')
+    worker_options(command, 16)
+
+    command = db_command('dump', 'Stream the whole db to a JSON file')
+    command.add_argument('file')
+
+    command = db_command('bench', 'Generate load and report throughput and latency percentiles')
+    command.add_argument('--ops', type=int, default=1000)
+    command.add_argument('--keys', type=int, default=100, help='Distinct keys for keyvalue and docstore dbs')
+    command.add_argument('--read-ratio', type=float, default=0.5)
+    command.add_argument('--value-size', type=int, default=100)
+    worker_options(command, 16)
+
+    command = commands.add_parser('replay', help='Replay a recorded request trace')
+    replay_arguments(command)
+    return parser
+
+
+async def run(args):
+    client = OrbitDbAPI(base_url=args.base_url, timeout=args.timeout, use_db_cache=False)
+    try:
+        return await {'load': load, 'dump': dump, 'bench': bench}[args.command](client, args)
+    finally:
+        await client.close()
+
+
+def main(argv=None):
+    args = parser().parse_args(argv)
+    if not args.base_url:
+        sys.exit('No --base-url given and ORBIT_DB_HTTP_API_URL is not set')
+    logging.basicConfig(stream=sys.stderr, level=args.log_level.upper())
+    if args.command == 'replay':
+        return run_replay(args)
+    sys.exit(1 if asyncio.run(run(args)) else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,175 +1,264 @@
+import asyncio
 import json
 import logging
-from pprint import pformat
-from urllib.parse import quote as urlquote
-import uuid
-
-import httpx
-from sseclient import SSEClient
+import time
 
 from .asyncDB import DB
+from .core import ApiCore, Call, EventParser, Wait
+
 
+class OrbitDbAPI (ApiCore):
+    _db_class = DB
 
-class OrbitDbAPI ():
     def __init__ (self, **kwargs):
-        self.logger = logging.getLogger(__name__)
-        self.__config = kwargs
-        self.__base_url = self.__config.get('base_url')
-        self.__use_db_cache = self.__config.get('use_db_cache', True)
-        self.__timeout = self.__config.get('timeout', 30)
-        self.__headers = httpx.Headers(self.__config.get('headers', {}))
+        import httpx
+        super().__init__(**kwargs)
+        self.__headers = httpx.Headers(self.config.get('headers', {}))
+        if 'accept-encoding' not in self.__headers:
+            self.__headers['accept-encoding'] = self._accept_encoding()
         self.__client = httpx.AsyncClient(
             headers=self.__headers,
-            timeout=self.__timeout
+            timeout=self.timeout
         )
-        self.__session = None
-        self.__sseClients = []
-        self.__dbs = []
-        self.logger.debug(f'Base url: {self.__base_url}')
         self.logger.debug(f'Headers: {self.__headers.items()}')
 
-    def __enter__(self):
-        if not self.__session:
-            self.create_session()
+    async def __aenter__(self):
+        if not self.session_id:
+            await self.create_session()
         return self
 
-    def __exit__(self, type, value, tb):
-        self.destroy_session()
+    async def __aexit__(self, type, value, tb):
+        try:
+            await self.destroy_session()
+        except Exception:
+            # An error from the async with block is the one worth raising
+            if value is None: raise
+            self.logger.exception('Failed to destroy session')
 
     @property
     def raw_client(self):
         return self.__client
 
-    @property
-    def base_url(self):
-        return self.__base_url
+    async def close(self):
+        closing = [task for task in self._close() if task is not None]
+        if closing: await asyncio.gather(*closing, return_exceptions=True)
+        await self.__client.close()
 
-    @property
-    def use_db_cache(self):
-        return self.__use_db_cache
-
-    def create_session(self):
-        if self.__session:
-            raise Exception('Session already registered')
-        session = uuid.uuid4()
-        endpoint = '/'.join(['sessions', session])
-        self._call('POST', endpoint)
-        self.__sesssion = session
-
-    def destroy_session(self):
-        endpoint = '/'.join(['sessions', self.__session])
-        self._call('DELETE', endpoint)
-        self.__session = None
+    def _set_header(self, name, value):
+        if value is None:
+            if name in self.__client.headers: del self.__client.headers[name]
+        else:
+            self.__client.headers[name] = value
 
-    def close(self):
-        for db in self.__dbs:
-            db.close()
-        for sseClient in self.__sseClients:
-            sseClient.close()
-        return self.__client.close()
-
-    def _remove_db(self, db):
-        del self.__dbs[self.__dbs.index(db)]
-
-    def _do_request(self, *args, **kwargs):
-        self.logger.log(15, json.dumps([args, kwargs]))
-        #kwargs['timeout'] = kwargs.get('timeout', self.__timeout)
+    async def _drive(self, op):
+        result, error = None, None
+        # Event streams stay open for the whole op, so events between two waits are kept
+        streams = {}
+        # Closing the op on cancellation or interrupts lets it roll back, it is a no-op once finished
         try:
-            return self.__client.request(*args, **kwargs)
-        except:
-            self.logger.exception('Exception during api call')
+            while True:
+                try:
+                    call = op.send(result) if error is None else op.throw(error)
+                except StopIteration as ex:
+                    return ex.value
+                try:
+                    result, error = await self._perform(call, streams), None
+                except Exception as ex:
+                    result, error = None, ex
+        finally:
+            op.close()
+            for stream in streams.values():
+                await stream.close()
+
+    async def _perform(self, call, streams=None):
+        if type(call) is Wait:
+            return await self._wait(call, streams)
+        policy = self.timeout_policy
+        if not policy.observing:
+            return await self._send(call, policy.timeout_for(call))
+        delay = policy.hedge_delay(call)
+        if delay is None:
+            return await self._observed(call)
+        return await self._hedged(call, delay)
+
+    async def _observed(self, call):
+        from httpx.exceptions import Timeout
+        policy = self.timeout_policy
+        timeout = policy.timeout_for(call)
+        started = time.perf_counter()
+        try:
+            result = await self._send(call, timeout)
+        except Timeout:
+            # Keeps timed out requests from pulling the percentiles down
+            policy.observe(call, timeout)
             raise
+        policy.observe(call, time.perf_counter() - started)
+        return result
 
-    def _call_raw(self, method, endpoint, **kwargs):
-        url = '/'.join([self.__base_url, endpoint])
-        return self._do_request(method, url, **kwargs)
+    async def _hedged(self, call, delay):
+        # A second copy of the read goes out once the first is slower than usual, the first answer wins
+        tasks = {asyncio.ensure_future(self._observed(call))}
+        try:
+            done, tasks = await asyncio.wait(tasks, timeout=delay)
+            if done: return done.pop().result()
+            self.timeout_policy.hedged += 1
+            tasks.add(asyncio.ensure_future(self._observed(call)))
+            error = None
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None: return task.result()
+                    if error is None: error = task.exception()
+            raise error
+        finally:
+            for task in tasks: task.cancel()
 
-    async def _call(self, method, endpoint,  **kwargs):
-        res = await self._call_raw(method, endpoint, **kwargs)
+    async def _send(self, call, timeout):
+        if call.mode == Call.BYTES:
+            return await self._read_bytes(call.method, call.url, call.sink, call.cache, timeout=timeout, **call.kwargs)
+        return self._decode(await self._do_request(call.method, call.url, call.cache, timeout=timeout, **call.kwargs))
+
+    async def _wait(self, wait, streams):
+        if wait.events_url is None or streams is None:
+            await asyncio.sleep(wait.seconds)
+            return None
+        stream = streams.get(wait.events_url)
+        if stream is None:
+            import httpx
+            timeout = httpx.TimeoutConfig(connect_timeout=self.timeout, read_timeout=None, write_timeout=self.timeout)
+            res = await self._do_request('GET', wait.events_url, stream=True, timeout=timeout)
+            try:
+                res.raise_for_status()
+            except Exception:
+                await res.close()
+                raise
+            stream = streams[wait.events_url] = EventWaiter(res)
+        return await stream.next_event(wait.seconds)
+
+    async def _do_request(self, method, url, cache=None, **kwargs):
+        if self.logger.isEnabledFor(15):
+            self.logger.log(15, json.dumps([[method, url], kwargs]))
+        #kwargs['timeout'] = kwargs.get('timeout', self.timeout)
+        recorder = self.recorder
+        if recorder: started = recorder.clock()
         try:
-            result = res.json()
-        except:
-            self.logger.warning('Json decode error', exc_info=True)
-            self.logger.log(15, res.text)
+            res = await self.__client.request(method, url, **self._encode_body(kwargs))
+        except Exception:
+            self.logger.exception('Exception during api call')
             raise
+        if recorder: self._trace(method, url, kwargs, recorder.clock() - started, cache)
+        return res
+
+    async def _call_raw(self, method, endpoint, **kwargs):
+        return await self._do_request(method, self._url(endpoint), **kwargs)
+
+    async def _call(self, method, endpoint,  **kwargs):
+        return self._decode(await self._call_raw(method, endpoint, **kwargs))
+
+    async def _read_bytes(self, method, url, sink=None, cache=None, **kwargs):
+        res = await self._do_request(method, url, cache, stream=sink is not None, **kwargs)
         try:
             res.raise_for_status()
         except:
             self.logger.exception('Server Error')
-            self.logger.error(pformat(result))
+            await res.close()
             raise
-        return result
+        if sink is None:
+            return res.content
+        try:
+            size = 0
+            async for chunk in res.stream():
+                sink.write(chunk)
+                size += len(chunk)
+            return size
+        finally:
+            await res.close()
 
-    def list_dbs(self):
-        return self._call('GET', 'dbs')
-
-    async def db(self, dbname, local_options=None, **kwargs):
-        if local_options is None: local_options = {}
-        db = DB(self, await self.open_db(dbname, **kwargs), **{**self.__config, **local_options})
-        self.__dbs.append(db)
-        return db
-
-    async def open_db(self, dbname, **kwargs):
-        endpoint = '/'.join(['db', urlquote(dbname, safe='')])
-        return await self._call('POST', endpoint, **kwargs)
-
-    def async_open_db(self, dbname, **kwargs):
-        json = kwargs.get('json', {})
-        json['awaitOpen'] = False
-        endpoint = '/'.join(['db', urlquote(dbname, safe='')])
-        events = self.events('open,ready,load')
-        dbInfo = self._call('POST', endpoint, **kwargs)
-        if (not 'ready' in dbInfo) or (not dbInfo['ready']):
-            self.logger.info('Waiting for db to be ready...')
-
-    def searches(self):
-        endpoint = '/'.join(['peers', 'searches'])
-        return self._call('GET', endpoint)
-
-    def events(self, eventnames):
-        endpoint = '/'.join(['events', urlquote(eventnames, safe='')])
-        res = self._call_raw('GET', endpoint, stream=True)
+    async def _events(self, url, sseClients):
+        res = await self._do_request('GET', url, stream=True)
         res.raise_for_status()
-        sseClient = SSEClient(res.stream())
-        self.__sseClients.append(sseClient)
-        for event in sseClient.events():
-            event.json = json.loads(event.data)
-            yield event
-        del self.__sseClients[self.__sseClients.index(sseClient)]
-
-
-class SSEventStream(SSEClient):
-    def __init__(self, parent, res, char_enc='utf-8'):
-        super().__init__(self.eventStream(), char_enc)
-        self.__parent = parent
+        sseClient = SSEventStream(res)
+        sseClients.add(sseClient)
+        try:
+            async for event in sseClient.events():
+                yield event
+        finally:
+            sseClients.discard(sseClient)
+
+
+class EventWaiter():
+    # A read still pending when a wait times out is picked up by the next wait, not cancelled
+    def __init__(self, res):
+        self.__res = res
+        self.__chunks = res.stream().__aiter__()
+        self.__parser = EventParser()
+        self.__events = []
+        self.__read = None
+        self.__ended = False
+
+    async def __next_chunk(self):
+        try:
+            return await self.__chunks.__anext__()
+        except StopAsyncIteration:
+            return None
+
+    async def next_event(self, seconds):
+        loop = asyncio.get_event_loop()
+        deadline = loop.time() + seconds
+        while not self.__ended:
+            if self.__events: return self.__events.pop(0)
+            if self.__read is None:
+                self.__read = asyncio.ensure_future(self.__next_chunk())
+            done, _pending = await asyncio.wait({self.__read}, timeout=max(deadline - loop.time(), 0))
+            if not done: return None
+            read, self.__read = self.__read, None
+            try:
+                chunk = read.result()
+            except Exception:
+                chunk = None
+            if chunk is None:
+                self.__ended = True
+            else:
+                self.__events.extend(self.__parser.feed(chunk))
+        # An ended stream still waits out the interval, so callers keep their backoff
+        remaining = deadline - loop.time()
+        if remaining > 0: await asyncio.sleep(remaining)
+        return None
+
+    async def close(self):
+        if self.__read is not None:
+            self.__read.cancel()
+        await self.__res.close()
+
+
+class SSEventStream():
+    def __init__(self, res, char_enc='utf-8'):
         self.__res = res
+        self.__parser = EventParser(char_enc)
         self.__complete = False
-        self.logger = logging.getLogger(f'{__name__}.{__class__}')
+        self.__closing = None
+        self.logger = logging.getLogger(f'{__name__}.{__class__.__name__}')
 
     @property
     def complete(self):
         return self.__complete
 
-    def eventStream(self):
-        try:
-            for b in self.__res.stream():
-                if self.__complete:
-                    raise StopIteration()
-                yield b
-
-        except StopIteration:
-            self.__res.close()
-            raise
-
-    def __enter__(self):
-        self.__parent._addSSEClient(self)
-        return self
-
-    def __exit__(self, type, value, tb):
+    def close(self):
+        # Closing the response also ends a read still waiting for the next chunk
+        if self.__closing is None:
             self.__complete = True
-            self.__parent._removeSSEClient(self)
+            self.__closing = asyncio.ensure_future(self.__res.close())
+        return self.__closing
 
-    # def awaitEvent(self, event_name):
-    #     for event in events:
-    #         if event.event == event_name:
-    #             logger
+    async def events(self):
+        try:
+            async for chunk in self.__res.stream():
+                for event in self.__parser.feed(chunk):
+                    event.json = json.loads(event.data)
+                    yield event
+                if self.__complete:
+                    break
+        except Exception:
+            if self.__closing is None: raise
+        finally:
+            await self.close()
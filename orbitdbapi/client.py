@@ -1,106 +1,228 @@
+import asyncio
 import json
-import logging
-from pprint import pformat
-from urllib.parse import quote as urlquote
-
-import httpx
-from sseclient import SSEClient
+import queue
+import threading
+import time
 
+from .core import ApiCore, Call, EventParser, Wait
 from .db import DB
 
 
-class OrbitDbAPI ():
+class OrbitDbAPI (ApiCore):
+    _db_class = DB
+
     def __init__ (self, **kwargs):
-        self.logger = logging.getLogger(__name__)
-        self.__config = kwargs
-        self.__base_url = self.__config.get('base_url')
-        self.__use_db_cache = self.__config.get('use_db_cache', True)
-        self.__timeout = self.__config.get('timeout', 30)
-        self.__headers = httpx.Headers(self.__config.get('headers', {}))
+        import httpx
+        super().__init__(**kwargs)
+        self.__headers = httpx.Headers(self.config.get('headers', {}))
+        if 'accept-encoding' not in self.__headers:
+            self.__headers['accept-encoding'] = self._accept_encoding()
         self.__session = httpx.Client(
             headers=self.__headers,
-            timeout=self.__timeout
+            timeout=self.timeout
         )
-        self.__sseClients = []
-        self.__dbs = []
-        self.logger.debug(f'Base url: {self.__base_url}')
         self.logger.debug(f'Headers: {self.__headers.items()}')
+        if self.timeout_policy.hedge:
+            self.logger.warning('hedge_reads is only supported by the async client, reads will not be hedged')
 
-    @property
-    def session(self):
-        return self.__session
+    def __enter__(self):
+        if not self.session_id:
+            self.create_session()
+        return self
 
-    @property
-    def base_url(self):
-        return self.__base_url
+    def __exit__(self, type, value, tb):
+        try:
+            self.destroy_session()
+        except Exception:
+            # An error from the with block is the one worth raising
+            if value is None: raise
+            self.logger.exception('Failed to destroy session')
 
     @property
-    def use_db_cache(self):
-        return self.__use_db_cache
+    def session(self):
+        return self.__session
 
     def close(self):
-        for db in self.__dbs:
-            db.close()
-        for sseClient in self.__sseClients:
-            sseClient.close()
+        self._close()
         self.__session.close()
 
-    def _remove_db(self, db):
-        del self.__dbs[self.__dbs.index(db)]
+    def _set_header(self, name, value):
+        if value is None:
+            if name in self.__session.headers: del self.__session.headers[name]
+        else:
+            self.__session.headers[name] = value
+
+    def _drive(self, op):
+        result, error = None, None
+        # Event streams stay open for the whole op, so events between two waits are kept
+        streams = {}
+        # Closing the op on cancellation or interrupts lets it roll back, it is a no-op once finished
+        try:
+            while True:
+                try:
+                    call = op.send(result) if error is None else op.throw(error)
+                except StopIteration as ex:
+                    return ex.value
+                try:
+                    result, error = self._perform(call, streams), None
+                except Exception as ex:
+                    result, error = None, ex
+        finally:
+            op.close()
+            for stream in streams.values():
+                stream.close()
+
+    def _perform(self, call, streams=None):
+        if type(call) is Wait:
+            return self._wait(call, streams)
+        policy = self.timeout_policy
+        timeout = policy.timeout_for(call)
+        if not policy.observing:
+            return self._send(call, timeout)
+        from httpx.exceptions import Timeout
+        started = time.perf_counter()
+        try:
+            result = self._send(call, timeout)
+        except Timeout:
+            # Keeps timed out requests from pulling the percentiles down
+            policy.observe(call, timeout)
+            raise
+        policy.observe(call, time.perf_counter() - started)
+        return result
 
-    def _do_request(self, *args, **kwargs):
-        self.logger.log(15, json.dumps([args, kwargs]))
-        #kwargs['timeout'] = kwargs.get('timeout', self.__timeout)
+    def _send(self, call, timeout):
+        if call.mode == Call.BYTES:
+            return self._read_bytes(call.method, call.url, call.sink, call.cache, timeout=timeout, **call.kwargs)
+        return self._decode(self._do_request(call.method, call.url, call.cache, timeout=timeout, **call.kwargs))
+
+    def _wait(self, wait, streams):
+        if wait.events_url is None or streams is None:
+            time.sleep(wait.seconds)
+            return None
+        stream = streams.get(wait.events_url)
+        if stream is None:
+            import httpx
+            timeout = httpx.TimeoutConfig(connect_timeout=self.timeout, read_timeout=None, write_timeout=self.timeout)
+            stream = EventStream(wait.events_url, dict(self.__session.headers), timeout)
+            streams[wait.events_url] = stream
+        return stream.next_event(wait.seconds)
+
+    def _do_request(self, method, url, cache=None, **kwargs):
+        if self.logger.isEnabledFor(15):
+            self.logger.log(15, json.dumps([[method, url], kwargs]))
+        #kwargs['timeout'] = kwargs.get('timeout', self.timeout)
+        recorder = self.recorder
+        if recorder: started = recorder.clock()
         try:
-            return self.__session.request(*args, **kwargs)
-        except:
+            res = self.__session.request(method, url, **self._encode_body(kwargs))
+        except Exception:
             self.logger.exception('Exception during api call')
             raise
+        if recorder: self._trace(method, url, kwargs, recorder.clock() - started, cache)
+        return res
 
     def _call_raw(self, method, endpoint, **kwargs):
-        url = '/'.join([self.__base_url, endpoint])
-        return self._do_request(method, url, **kwargs)
+        return self._do_request(method, self._url(endpoint), **kwargs)
 
     def _call(self, method, endpoint,  **kwargs):
-        res = self._call_raw(method, endpoint, **kwargs)
-        try:
-            result = res.json()
-        except:
-            self.logger.warning('Json decode error', exc_info=True)
-            self.logger.log(15, res.text)
-            raise
+        return self._decode(self._call_raw(method, endpoint, **kwargs))
+
+    def _read_bytes(self, method, url, sink=None, cache=None, **kwargs):
+        res = self._do_request(method, url, cache, stream=sink is not None, **kwargs)
         try:
             res.raise_for_status()
         except:
             self.logger.exception('Server Error')
-            self.logger.error(pformat(result))
+            res.close()
             raise
-        return result
-
-    def list_dbs(self):
-        return self._call('GET', 'dbs')
-
-    def db(self, dbname, local_options=None, **kwargs):
-        if local_options is None: local_options = {}
-        db = DB(self, self.open_db(dbname, **kwargs), **{**self.__config, **local_options})
-        self.__dbs.append(db)
-        return db
-
-    def open_db(self, dbname, **kwargs):
-        endpoint = '/'.join(['db', urlquote(dbname, safe='')])
-        return self._call('POST', endpoint, **kwargs)
-
-    def searches(self):
-        endpoint = '/'.join(['peers', 'searches'])
-        return self._call('GET', endpoint)
-
-    def events(self, eventnames):
-        endpoint = '/'.join(['events', urlquote(eventnames, safe='')])
-        res = self._call_raw('GET', endpoint, stream=True)
+        if sink is None:
+            return res.content
+        try:
+            size = 0
+            for chunk in res.stream():
+                sink.write(chunk)
+                size += len(chunk)
+            return size
+        finally:
+            res.close()
+
+    def _events(self, url, sseClients):
+        from sseclient import SSEClient
+        res = self._do_request('GET', url, stream=True)
         res.raise_for_status()
         sseClient = SSEClient(res.stream())
-        self.__sseClients.append(sseClient)
+        sseClients.add(sseClient)
         for event in sseClient.events():
             event.json = json.loads(event.data)
             yield event
-        del self.__sseClients[self.__sseClients.index(sseClient)]
+        sseClients.discard(sseClient)
+
+
+class EventStream():
+    # Reads an event stream on its own thread and loop, a sync read can not time out without dropping it
+    def __init__(self, url, headers, timeout):
+        self.__events = queue.Queue()
+        self.__loop = asyncio.new_event_loop()
+        self.__task = None
+        self.__error = None
+        self.__ended = False
+        self.__opened = threading.Event()
+        self.__thread = threading.Thread(target=self.__run, args=(url, headers, timeout), daemon=True)
+        self.__thread.start()
+        self.__opened.wait()
+        if self.__error is not None:
+            self.__thread.join()
+            raise self.__error
+
+    def __run(self, url, headers, timeout):
+        asyncio.set_event_loop(self.__loop)
+        self.__task = self.__loop.create_task(self.__read(url, headers, timeout))
+        try:
+            self.__loop.run_until_complete(self.__task)
+        except BaseException:
+            pass
+        finally:
+            self.__events.put(None)
+            self.__opened.set()
+            self.__loop.close()
+
+    async def __read(self, url, headers, timeout):
+        import httpx
+        async with httpx.AsyncClient(headers=headers, timeout=timeout) as client:
+            try:
+                res = await client.request('GET', url, stream=True)
+                res.raise_for_status()
+            except Exception as ex:
+                self.__error = ex
+                return
+            finally:
+                self.__opened.set()
+            try:
+                parser = EventParser()
+                async for chunk in res.stream():
+                    for event in parser.feed(chunk):
+                        self.__events.put(event)
+            finally:
+                await res.close()
+
+    def next_event(self, seconds):
+        deadline = time.monotonic() + seconds
+        if not self.__ended:
+            try:
+                event = self.__events.get(timeout=seconds)
+            except queue.Empty:
+                return None
+            if event is not None: return event
+            self.__ended = True
+        # An ended stream still waits out the interval, so callers keep their backoff
+        remaining = deadline - time.monotonic()
+        if remaining > 0: time.sleep(remaining)
+        return None
+
+    def close(self):
+        if not self.__thread.is_alive(): return
+        try:
+            self.__loop.call_soon_threadsafe(self.__task.cancel)
+        except RuntimeError:
+            pass
+        self.__thread.join()
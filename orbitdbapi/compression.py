@@ -0,0 +1,53 @@
+import json
+import zlib
+
+from httpx.decoders import SUPPORTED_DECODERS, Decoder
+from httpx.exceptions import DecodingError
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Preferred first, httpx only knows br when brotli is installed
+PREFERRED_ENCODINGS = ('zstd', 'br', 'gzip', 'deflate')
+
+
+class ZstdDecoder(Decoder):
+    def __init__(self):
+        self.decompressor = zstandard.ZstdDecompressor().decompressobj()
+
+    def decode(self, data):
+        try:
+            return self.decompressor.decompress(data)
+        except zstandard.ZstdError as exc:
+            raise DecodingError from exc
+
+    def flush(self):
+        return b''
+
+
+# httpx looks decoders up in this module level table, so zstd is registered for the whole process once a client
+# first loads this module. Other httpx clients only see it when they ask a server for zstd themselves.
+if zstandard is not None:
+    SUPPORTED_DECODERS.setdefault('zstd', ZstdDecoder)
+
+
+def accept_encoding():
+    return ', '.join(encoding for encoding in PREFERRED_ENCODINGS if encoding in SUPPORTED_DECODERS)
+
+
+def compress_body(kwargs, min_size, level=6):
+    # Only gzip goes upstream, it is what the node's body parser inflates
+    if 'json' not in kwargs: return kwargs
+    kwargs = dict(kwargs)
+    body = json.dumps(kwargs.pop('json')).encode()
+    headers = dict(kwargs.get('headers') or {})
+    headers['content-type'] = 'application/json'
+    if len(body) >= min_size:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+        body = compressor.compress(body) + compressor.flush()
+        headers['content-encoding'] = 'gzip'
+    kwargs['data'] = body
+    kwargs['headers'] = headers
+    return kwargs
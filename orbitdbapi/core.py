@@ -0,0 +1,833 @@
+import codecs
+import logging
+import re
+import time
+from collections.abc import Hashable, Iterable
+from copy import deepcopy
+from functools import lru_cache, partial, wraps
+from urllib.parse import quote as urlquote
+
+from .entry import split_entries
+from .overlay import WriteOverlay
+from .registry import HandleRegistry
+from .timeouts import TimeoutPolicy
+from .trace import TraceRecorder, payload_size
+
+_write_routes = ('/put', '/add', '/inc')
+
+CAP_GET = 1 << 0
+CAP_PUT = 1 << 1
+CAP_PUT_ALL = 1 << 2
+CAP_ADD = 1 << 3
+CAP_ITERATOR = 1 << 4
+CAP_REMOVE = 1 << 5
+CAP_QUERY = 1 << 6
+CAP_INC = 1 << 7
+CAP_VALUE = 1 << 8
+
+capability_flags = {
+    'get': CAP_GET,
+    'put': CAP_PUT,
+    'putAll': CAP_PUT_ALL,
+    'add': CAP_ADD,
+    'iterator': CAP_ITERATOR,
+    'remove': CAP_REMOVE,
+    'query': CAP_QUERY,
+    'inc': CAP_INC,
+    'value': CAP_VALUE
+}
+capability_names = {flag: name for name, flag in capability_flags.items()}
+CAP_WRITES = CAP_PUT | CAP_PUT_ALL | CAP_ADD | CAP_REMOVE | CAP_INC
+
+
+def capability_mask(capabilities):
+    mask = 0
+    for name in capabilities:
+        mask |= capability_flags.get(name, 0)
+    return mask
+
+
+def operation(steps):
+    # Operations are generators that yield Call objects and receive their
+    # results; the sync and async transports decide how each Call is performed.
+    @wraps(steps)
+    def run(self, *args, **kwargs):
+        return self._run(steps(self, *args, **kwargs))
+    run.steps = steps
+    return run
+
+
+def _options_key(options):
+    return tuple(sorted((name, repr(value)) for name, value in options.items()))
+
+
+def encode_key(item):
+    if type(item) is not str: item = str(item)
+    if item.isascii() and item.isalnum(): return item
+    return _quote_key(item)
+
+
+@lru_cache(maxsize=4096)
+def _quote_key(item):
+    return urlquote(item, safe='')
+
+
+class Call():
+    __slots__ = ('method', 'url', 'mode', 'sink', 'cache', 'op', 'kwargs')
+
+    JSON = 'json'
+    BYTES = 'bytes'
+
+    def __init__(self, method, url, mode=JSON, sink=None, cache=None, op=None, **kwargs):
+        self.method = method
+        self.url = url
+        self.mode = mode
+        self.sink = sink
+        self.cache = cache
+        # Names the endpoint for timeout classes and latency tracking
+        self.op = op
+        self.kwargs = kwargs
+
+    def __repr__(self):
+        return f'Call({self.method} {self.url}, mode={self.mode})'
+
+
+class Wait():
+    __slots__ = ('seconds', 'events_url')
+
+    # Sleeps, or with an events url resolves early with the next event, the stream stays open for the whole op
+    def __init__(self, seconds, events_url=None):
+        self.seconds = seconds
+        self.events_url = events_url
+
+    def __repr__(self):
+        return f'Wait({self.seconds}s, events_url={self.events_url})'
+
+
+class ApiCore():
+    _db_class = None
+
+    def __init__ (self, **kwargs):
+        self.logger = logging.getLogger(type(self).__module__)
+        self.__config = kwargs
+        self.__base_url = self.__config.get('base_url')
+        self.__url_prefix = f'{self.__base_url}/'
+        self.__use_db_cache = self.__config.get('use_db_cache', True)
+        self.__timeout = self.__config.get('timeout', 30)
+        self._sseClients = set()
+        self.__dbs = HandleRegistry(self.__config.get('db_idle_timeout'))
+        self.__reuse_dbs = self.__config.get('reuse_dbs', True)
+        # Sessions rely on a node that serves /sessions and scopes requests by this header,
+        # nothing shows stock orbit-db-http-api nodes doing either, create_session() fails against those
+        self.__session_header = self.__config.get('session_header', 'X-Orbitdb-Session')
+        self.__session_id = None
+        trace = self.__config.get('trace')
+        self.__owns_recorder = isinstance(trace, str)
+        if self.__owns_recorder:
+            trace = TraceRecorder(trace)
+        self.__recorder = trace
+        policy = self.__config.get('timeout_policy')
+        if policy is None:
+            policy = TimeoutPolicy(
+                self.__timeout,
+                self.__config.get('timeouts'),
+                adaptive=self.__config.get('adaptive_timeouts', False),
+                hedge=self.__config.get('hedge_reads', False)
+            )
+        self.__timeout_policy = policy
+        self.__compress_body = None
+        if self.__config.get('compress_requests'):
+            # Loaded only when asked for, the compression module brings httpx's decoders with it
+            from .compression import compress_body
+            self.__compress_body = partial(compress_body, min_size=self.__config.get('compress_min_size', 1024))
+        self.logger.debug(f'Base url: {self.__base_url}')
+
+    @property
+    def config(self):
+        return self.__config
+
+    @property
+    def base_url(self):
+        return self.__base_url
+
+    @property
+    def timeout(self):
+        return self.__timeout
+
+    @property
+    def use_db_cache(self):
+        return self.__use_db_cache
+
+    @property
+    def dbs(self):
+        return self.__dbs.handles()
+
+    @property
+    def session_id(self):
+        return self.__session_id
+
+    @property
+    def timeout_policy(self):
+        return self.__timeout_policy
+
+    @property
+    def recorder(self):
+        return self.__recorder
+
+    def _run(self, op):
+        return self._drive(op)
+
+    def _drive(self, op):
+        raise NotImplementedError()
+
+    def _close_handles(self):
+        closing = []
+        for db in self.__dbs.clear():
+            closing.extend(db._close_streams())
+        closing.extend(sseClient.close() for sseClient in list(self._sseClients))
+        return closing
+
+    def _close(self):
+        closing = self._close_handles()
+        if self.__owns_recorder:
+            self.__recorder.close()
+        return closing
+
+    def _set_header(self, name, value):
+        raise NotImplementedError()
+
+    def _remove_db(self, db):
+        self.__dbs.remove(db)
+
+    def _release_db(self, db):
+        return self.__dbs.release(db)
+
+    def _url(self, endpoint):
+        return self.__url_prefix + endpoint
+
+    def _encode_body(self, kwargs):
+        if self.__compress_body is None: return kwargs
+        return self.__compress_body(kwargs)
+
+    def _accept_encoding(self):
+        if not self.__config.get('compress_responses', True): return 'identity'
+        from .compression import accept_encoding
+        return accept_encoding()
+
+    def _trace(self, method, url, kwargs, latency, cache=None):
+        if url.startswith(self.__url_prefix): url = url[len(self.__url_prefix):]
+        # Write payloads are only recorded by size, other bodies are small options
+        body = None if url.endswith(_write_routes) else kwargs.get('json')
+        self.__recorder.record(method, url, payload_size(kwargs), latency, cache, body)
+
+    def _decode(self, res):
+        try:
+            result = res.json()
+        except:
+            self.logger.warning('Json decode error', exc_info=True)
+            self.logger.log(15, res.text)
+            raise
+        try:
+            res.raise_for_status()
+        except:
+            from pprint import pformat
+            self.logger.exception('Server Error')
+            self.logger.error(pformat(result))
+            raise
+        return result
+
+    @operation
+    def create_session(self):
+        if self.__session_id:
+            raise SessionError(f'Session {self.__session_id} already registered')
+        from uuid import uuid4
+        session_id = str(uuid4())
+        yield Call('POST', self._url(f'sessions/{session_id}'), op='session')
+        self.__session_id = session_id
+        # A node with session support scopes every later request by this header
+        self._set_header(self.__session_header, session_id)
+        return session_id
+
+    @operation
+    def destroy_session(self):
+        session_id = self.__session_id
+        if not session_id: return
+        self.__session_id = None
+        self._set_header(self.__session_header, None)
+        try:
+            yield Call('DELETE', self._url(f'sessions/{session_id}'), op='session')
+        finally:
+            # The server has dropped the session's dbs and subscriptions in one go
+            self._close_handles()
+
+    @operation
+    def list_dbs(self):
+        return (yield Call('GET', self._url('dbs'), op='dbs'))
+
+    @operation
+    def db(self, dbname, local_options=None, **kwargs):
+        if local_options is None: local_options = {}
+        yield from self.unload_idle.steps(self)
+        # Handles with different local options behave differently, so they are never shared
+        options = _options_key(local_options)
+        if self.__reuse_dbs:
+            db = self.__dbs.acquire((dbname, options))
+            if db is not None:
+                if kwargs and kwargs != self.__dbs.options(db):
+                    self.logger.warning(f'Db {dbname} is already open, reusing it without the new open options')
+                return db
+        params = yield from self.open_db.steps(self, dbname, **kwargs)
+        if self.__reuse_dbs:
+            # A name and an address can resolve to the same db
+            db = self.__dbs.acquire((params['id'], options))
+            if db is not None:
+                self.__dbs.alias(db, (dbname, options))
+                return db
+        db = self._db_class(self, params, **{**self.__config, **local_options})
+        if self.__reuse_dbs:
+            self.__dbs.register(db, db.id, (dbname, options), (db.id, options), options=kwargs)
+        else:
+            self.__dbs.register(db, db.id)
+        return db
+
+    @operation
+    def unload_idle(self):
+        unloaded = []
+        for address in self.__dbs.expired():
+            try:
+                yield Call('DELETE', self._url(f"db/{urlquote(address, safe='')}"), op='unload')
+                unloaded.append(address)
+            except Exception:
+                self.logger.warning(f'Failed to unload idle db {address}', exc_info=True)
+        return unloaded
+
+    @operation
+    def open_db(self, dbname, **kwargs):
+        endpoint = '/'.join(['db', urlquote(dbname, safe='')])
+        return (yield Call('POST', self._url(endpoint), op='open', **kwargs))
+
+    @operation
+    def searches(self):
+        endpoint = '/'.join(['peers', 'searches'])
+        return (yield Call('GET', self._url(endpoint), op='searches'))
+
+    def events(self, eventnames):
+        endpoint = '/'.join(['events', urlquote(eventnames, safe='')])
+        return self._events(self._url(endpoint), self._sseClients)
+
+
+class Routes():
+    __slots__ = (
+        'item', 'raw', 'put', 'add', 'inc', 'iterator', 'rawiterator',
+        'info', 'unload', 'value', 'index', 'all', 'peers'
+    )
+
+    def __init__(self, url):
+        self.item = f'{url}/'
+        self.raw = f'{url}/raw/'
+        self.put = f'{url}/put'
+        self.add = f'{url}/add'
+        self.inc = f'{url}/inc'
+        self.iterator = f'{url}/iterator'
+        self.rawiterator = f'{url}/rawiterator'
+        self.info = Call('GET', url, op='info')
+        self.unload = Call('DELETE', url, op='unload')
+        self.value = Call('GET', f'{url}/value', op='value')
+        self.index = Call('GET', f'{url}/index', op='index')
+        self.all = Call('GET', f'{url}/all', op='all')
+        self.peers = Call('GET', f'{url}/peers', op='peers')
+
+
+class DBCore():
+    __slots__ = (
+        '__cache', '_client', '__params', '__dbname', '__id', '__id_safe', '__type', '__caps',
+        '__denied', '__enforce_caps', '__check_access', '__indexed', '__index_by', '__use_cache', '__enforce_indexby', '__url',
+        '__routes', '__overlay', '__overlay_ttl', '_sseClients', '__weakref__'
+    )
+
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, client, params, **kwargs):
+        self.__cache = {}
+        self._client = client
+        # The raw params are only read again for the rarely used raw accessors
+        self.__params = params
+        db_options = params.get('options', {})
+        self.__dbname = params['dbname']
+        self.__id = params['id']
+        self.__id_safe = urlquote(self.__id, safe='')
+        self.__type = params['type']
+        self.__caps = capability_mask(params.get('capabilities', []))
+        self.__enforce_caps = kwargs.get('enforce_caps', True)
+        self.__check_access = kwargs.get('check_write_access', True)
+        self.__update_denied()
+        self.__indexed = 'indexBy' in db_options
+        self.__index_by = db_options.get('indexBy')
+        self.__use_cache = kwargs.get('use_db_cache', client.use_db_cache)
+        self.__enforce_indexby = kwargs.get('enforce_indexby', True)
+        self.__url = client._url(f'db/{self.__id_safe}')
+        self.__routes = None
+        self.__overlay = None
+        # None turns read-your-writes off, 0 drops each write as soon as its hash is back
+        self.__overlay_ttl = kwargs.get('overlay_ttl', 0) if kwargs.get('read_your_writes', True) else None
+        self._sseClients = set()
+
+    def _run(self, op):
+        return self._client._drive(op)
+
+    @property
+    def _routes(self):
+        # Built on first request so idle handles stay small
+        if self.__routes is None:
+            self.__routes = Routes(self.__url)
+        return self.__routes
+
+    def __update_denied(self):
+        # Capabilities the write and read calls refuse to use, zero when nothing is enforced
+        self.__denied = ~self.__caps if self.__enforce_caps else 0
+        if self.__check_access and not self.writable:
+            self.__denied |= CAP_WRITES
+
+    def _require(self, flag):
+        if self.__denied & flag:
+            if self.__caps & flag or not self.__enforce_caps:
+                raise WriteAccessError(f'Db {self.__dbname} is not writable by this identity')
+            raise CapabilityError(f'Db {self.__dbname} does not have {capability_names[flag]} capability')
+
+    def _require_write(self, flag):
+        # Access may have been granted since it was last read, the node is asked again before refusing
+        if self.__denied & flag & CAP_WRITES and (self.__caps & flag or not self.__enforce_caps):
+            yield from self.refresh_access.steps(self)
+        self._require(flag)
+
+    @property
+    def _overlay(self):
+        if self.__overlay is None and self.__overlay_ttl is not None:
+            self.__overlay = WriteOverlay(self.__overlay_ttl)
+        return self.__overlay
+
+    def _tracked_steps(self, key, value, call, removed=False):
+        # Reads of key resolve to value until the server has confirmed the write
+        overlay = self._overlay
+        if overlay is None or key is None: return (yield call)
+        pending = overlay.begin(key, value, removed)
+        try:
+            result = yield call
+        except BaseException:
+            overlay.fail(pending)
+            raise
+        overlay.confirm(pending, result.get('hash') if isinstance(result, dict) else None)
+        return result
+
+    def reconcile(self, entry_hash):
+        if self.__overlay is None: return False
+        return self.__overlay.reconcile(entry_hash)
+
+    @property
+    def pending_writes(self):
+        return 0 if self.__overlay is None else len(self.__overlay)
+
+    def clear_cache(self):
+        self.__cache = {}
+
+    def cache_get(self, item):
+        item = str(item)
+        return deepcopy(self.__cache.get(item))
+
+    def cache_remove(self, item):
+        item = str(item)
+        if item in self.__cache:
+            del self.__cache[item]
+
+    @property
+    def cached(self):
+        return self.__use_cache
+
+    @property
+    def index_by(self):
+        return self.__index_by
+
+    @property
+    def cache(self):
+        return deepcopy(self.__cache)
+
+    @property
+    def params(self):
+        return deepcopy(self.__params)
+
+    @property
+    def dbname(self):
+        return self.__dbname
+
+    @property
+    def id(self):
+        return self.__id
+
+    @property
+    def dbtype(self):
+        return self.__type
+
+    @property
+    def capabilities(self):
+        return list(self.__params.get('capabilities', []))
+
+    @property
+    def capability_mask(self):
+        return self.__caps
+
+    @property
+    def queryable(self):
+        return bool(self.__caps & CAP_QUERY)
+
+    @property
+    def putable(self):
+        return bool(self.__caps & CAP_PUT)
+
+    @property
+    def removeable(self):
+        return bool(self.__caps & CAP_REMOVE)
+
+    @property
+    def iterable(self):
+        return bool(self.__caps & CAP_ITERATOR)
+
+    @property
+    def addable(self):
+        return bool(self.__caps & CAP_ADD)
+
+    @property
+    def valuable(self):
+        return bool(self.__caps & CAP_VALUE)
+
+    @property
+    def incrementable(self):
+        return bool(self.__caps & CAP_INC)
+
+    @property
+    def indexed(self):
+        return self.__indexed
+
+    @property
+    def can_append(self):
+        return self.__params.get('canAppend')
+
+    @property
+    def write_access(self):
+        return deepcopy(self.__params.get('write'))
+
+    @property
+    def writable(self):
+        # Unknown access counts as writable and is left to the server to decide
+        return self.__params.get('canAppend') is not False
+
+    @operation
+    def refresh_access(self):
+        params = yield self._routes.info
+        self.__params = {**self.__params, 'canAppend': params.get('canAppend'), 'write': params.get('write')}
+        self.__update_denied()
+        return self.writable
+
+    @operation
+    def wait_writable(self, timeout=None, interval=0.5, max_interval=10):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        # Access controller changes reach the node by replication
+        eventnames = 'replicated'
+        while True:
+            if (yield from self.refresh_access.steps(self)): return True
+            event, eventnames = yield from self._wait_steps(deadline, interval, eventnames)
+            if event is None: interval = min(interval * 2, max_interval)
+
+    def close(self):
+        if self._client._release_db(self):
+            self._close_streams()
+
+    def _close_streams(self):
+        return [sseClient.close() for sseClient in list(self._sseClients)]
+
+    @operation
+    def info(self):
+        return (yield self._routes.info)
+
+    @operation
+    def get(self, item, cache=None, unpack=False):
+        if cache is None: cache = self.__use_cache
+        item = str(item)
+        if self.__overlay is not None:
+            pending = self.__overlay.lookup(item)
+            if pending is not None:
+                if pending.removed: return [] if self.__indexed else None
+                return deepcopy(pending.value)
+        if cache and item in self.__cache:
+            result = self.__cache[item]
+            if self._client.recorder:
+                self._client._trace('GET', self._routes.item + encode_key(item), {}, 0.0, 'hit')
+        else:
+            result = yield Call('GET', self._routes.item + encode_key(item), cache='miss' if cache else None, op='get')
+            if cache: self.__cache[item] = result
+        if isinstance(result, Hashable): return deepcopy(result)
+        if isinstance(result, Iterable): return deepcopy(result)
+        if unpack:
+            if isinstance(result, Iterable): return deepcopy(next(result, {}))
+            if isinstance(result, list): return deepcopy(next(iter(result), {}))
+        return result
+
+    @operation
+    def get_raw(self, item, raw_bytes=False, sink=None):
+        url = self._routes.raw + encode_key(item)
+        if raw_bytes or sink is not None:
+            return (yield Call('GET', url, mode=Call.BYTES, sink=sink, op='raw'))
+        return (yield Call('GET', url, op='raw'))
+
+    @operation
+    def put(self, item, cache=None):
+        yield from self._require_write(CAP_PUT)
+        if self.__indexed and (not self.__index_by in item) and self.__enforce_indexby:
+            raise MissingIndexError(f"The provided document {item} doesn't contain field '{self.__index_by}'")
+
+        if cache is None: cache = self.__use_cache
+        # Stored the way get() returns it, a one item list for docstores and the bare value otherwise
+        if self.__indexed:
+            key, value = item.get(self.__index_by), [item]
+        else:
+            key, value = item.get('key'), item.get('value')
+        if key is not None: key = str(key)
+        result = yield from self._tracked_steps(key, value, Call('POST', self._routes.put, op='put', json=item))
+        entry_hash = result.get('hash')
+        if cache:
+            if key is not None: self.__cache[key] = value
+            if entry_hash: self.__cache[entry_hash] = item
+        return entry_hash
+
+    @operation
+    def add(self, item, cache=None):
+        yield from self._require_write(CAP_ADD)
+        if cache is None: cache = self.__use_cache
+        entry_hash = (yield Call('POST', self._routes.add, op='add', json=item)).get('hash')
+        if cache and entry_hash: self.__cache[entry_hash] = item
+        return entry_hash
+
+    @operation
+    def inc(self, val):
+        yield from self._require_write(CAP_INC)
+        val = int(val)
+        return (yield Call('POST', self._routes.inc, op='inc', json={'val':val}))
+
+    @operation
+    def value(self):
+        return (yield self._routes.value)
+
+    @operation
+    def iterator_raw(self, raw_bytes=False, sink=None, **kwargs):
+        self._require(CAP_ITERATOR)
+        url = self._routes.rawiterator
+        if raw_bytes or sink is not None:
+            return (yield Call('GET', url, mode=Call.BYTES, sink=sink, op='iterator', json=kwargs))
+        return (yield Call('GET', url, op='iterator', json=kwargs))
+
+    @operation
+    def iterator(self, **kwargs):
+        self._require(CAP_ITERATOR)
+        return (yield Call('GET', self._routes.iterator, op='iterator', json=kwargs))
+
+    @operation
+    def iterator_entries(self, **kwargs):
+        # Entries stay undecoded slices of the response body until a field other than hash or clock is read.
+        # The scan costs a few times a plain json.loads, iterator() is faster when every payload gets read anyway
+        self._require(CAP_ITERATOR)
+        return split_entries((yield Call('GET', self._routes.iterator, mode=Call.BYTES, op='iterator', json=kwargs)))
+
+    @operation
+    def index(self):
+        return (yield self._routes.index)
+
+    @operation
+    def all(self, raw_bytes=False, sink=None):
+        if raw_bytes or sink is not None:
+            return (yield Call('GET', self._routes.all.url, mode=Call.BYTES, sink=sink, op='all'))
+        result = yield self._routes.all
+        if isinstance(result, Hashable):
+            self.__cache = result
+        return result
+
+    @operation
+    def remove(self, item):
+        yield from self._require_write(CAP_REMOVE)
+        item = str(item)
+        self.cache_remove(item)
+        return (yield from self._tracked_steps(item, None, Call('DELETE', self._routes.item + encode_key(item), op='remove'), removed=True))
+
+    @operation
+    def unload(self):
+        self._client._remove_db(self)
+        self._close_streams()
+        return (yield self._routes.unload)
+
+    @operation
+    def export_snapshot(self, path):
+        from .snapshot import entry_head, write_snapshot
+        header = {'id': self.__id, 'dbname': self.__dbname, 'type': self.__type}
+        if self.__caps & CAP_ITERATOR:
+            entries = yield Call('GET', self._routes.iterator, op='iterator', json={'limit': -1})
+            header.update(format='log', head=entry_head(entries))
+        elif self.__caps & CAP_PUT:
+            result = yield self._routes.all
+            if isinstance(result, dict):
+                header['format'] = 'pairs'
+                entries = [[key, value] for key, value in result.items()]
+            else:
+                header['format'] = 'docs'
+                entries = result
+        else:
+            raise CapabilityError(f'Db {self.__dbname} does not support snapshots')
+        return write_snapshot(path, header, entries)
+
+    @operation
+    def load_snapshot(self, path, cache=None):
+        from .snapshot import SnapshotError, read_snapshot
+        header, entries = read_snapshot(path)
+        if header.get('id') != self.__id:
+            raise SnapshotError(f"Snapshot {path} is of db {header.get('id')}, not {self.__id}")
+        if header.get('format') == 'log':
+            # Only the entries written after the snapshot head are fetched
+            query = {'limit': -1}
+            if header.get('head'): query['gt'] = header['head']
+            entries.extend((yield Call('GET', self._routes.iterator, op='iterator', json=query)))
+            # Entries are immutable and keyed by hash, so they can warm the cache like fetched ones
+            if cache is None: cache = self.__use_cache
+            if cache:
+                for entry in entries: self.__cache[entry['hash']] = entry
+            return entries
+        # Values are only as current as the snapshot and nothing refreshes them,
+        # so get() is only served from them when the caller asks with cache=True
+        if header.get('format') == 'pairs':
+            result = dict(entries)
+            if cache:
+                for key, value in result.items(): self.__cache[str(key)] = value
+            return result
+        if cache:
+            index_by = self.__index_by or '_id'
+            for doc in entries: self.__cache[str(doc.get(index_by))] = [doc]
+        return entries
+
+    def _events_url(self, eventnames):
+        return f"{self.__url}/events/{urlquote(eventnames, safe='')}"
+
+    def events(self, eventnames):
+        return self._client._events(self._events_url(eventnames), self._sseClients)
+
+    def _wait_steps(self, deadline, interval, eventnames):
+        # Waits for one of the events, falling back to plain polling when the stream fails
+        seconds = interval if deadline is None else min(interval, deadline - time.monotonic())
+        if seconds <= 0:
+            raise TimeoutError(f'Timed out waiting on db {self.__dbname}')
+        if eventnames is not None:
+            try:
+                return (yield Wait(seconds, self._events_url(eventnames))), eventnames
+            except Exception:
+                self.logger.debug(f'Event stream {eventnames} unavailable, polling instead', exc_info=True)
+        yield Wait(seconds)
+        return None, None
+
+    @operation
+    def wait_for_peers(self, min_count=1, timeout=None, interval=0.5, max_interval=10):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        try:
+            yield from self.find_peers.steps(self)
+        except Exception:
+            self.logger.warning(f'Peer search for db {self.__dbname} failed', exc_info=True)
+        eventnames = 'peer'
+        while True:
+            peers = yield self._routes.peers
+            if len(peers) >= min_count: return peers
+            event, eventnames = yield from self._wait_steps(deadline, interval, eventnames)
+            if event is None: interval = min(interval * 2, max_interval)
+
+    @operation
+    def wait_replicated(self, entry_hash, timeout=None, interval=0.5, max_interval=10):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        url = self._routes.raw + encode_key(entry_hash)
+        eventnames = 'replicated,replicate.progress'
+        while True:
+            try:
+                entry = yield Call('GET', url, op='raw')
+            except Exception:
+                entry = None
+            if entry:
+                self.reconcile(entry_hash)
+                return entry
+            event, eventnames = yield from self._wait_steps(deadline, interval, eventnames)
+            if event is None: interval = min(interval * 2, max_interval)
+
+    @operation
+    def find_peers(self, **kwargs):
+        endpoint = '/'.join(['peers','searches','db', self.__id_safe])
+        return (yield Call('POST', self._client._url(endpoint), op='find_peers', json=kwargs))
+
+    @operation
+    def get_peers(self):
+        return (yield self._routes.peers)
+
+
+class Event():
+    def __init__(self, id=None, event='message', data='', retry=None):
+        self.id = id
+        self.event = event
+        self.data = data
+        self.retry = retry
+
+    def __repr__(self):
+        return f'Event(event={self.event!r}, id={self.id!r})'
+
+
+class EventParser():
+    _line_end = re.compile(r'\r\n|\r|\n')
+
+    def __init__(self, char_enc='utf-8'):
+        self.__decoder = codecs.getincrementaldecoder(char_enc)(errors='replace')
+        self.__buffer = ''
+        self.__fields = {}
+        self.__data = []
+
+    def feed(self, chunk):
+        text = self.__buffer + self.__decoder.decode(chunk)
+        # Hold back a trailing CR, it may be the first half of a CRLF
+        end = len(text) - 1 if text.endswith('\r') else len(text)
+        *lines, rest = self._line_end.split(text[:end])
+        self.__buffer = rest + text[end:]
+        events = []
+        for line in lines:
+            if not line:
+                event = self.__dispatch()
+                if event is not None: events.append(event)
+                continue
+            if line.startswith(':'):
+                continue
+            name, _, value = line.partition(':')
+            if value.startswith(' '): value = value[1:]
+            if name == 'data':
+                self.__data.append(value)
+            elif name in ('event', 'id'):
+                self.__fields[name] = value
+            elif name == 'retry' and value.isdigit():
+                self.__fields[name] = int(value)
+        return events
+
+    def __dispatch(self):
+        data, fields = self.__data, self.__fields
+        self.__data, self.__fields = [], {}
+        if not data:
+            return None
+        return Event(data='\n'.join(data), **fields)
+
+
+class SessionError(Exception):
+    pass
+
+class CapabilityError(Exception):
+    pass
+
+class MissingIndexError(Exception):
+    pass
+
+class WriteAccessError(CapabilityError):
+    pass
@@ -0,0 +1,140 @@
+import json
+import re
+from functools import total_ordering
+
+# Strings as one token, so brackets inside them are skipped by the regex engine
+_tokens = re.compile(rb'"[^"\\]*(?:\\.[^"\\]*)*"|[\[\]{}]')
+_opening = frozenset(b'[{')
+_quote = ord('"')
+_hash_key = b'"hash"'
+_clock_key = b'"clock"'
+# Only a string hash and an object clock are taken, anything else is left for the full parse
+_string_value = re.compile(rb'\s*:\s*"')
+_object_value = re.compile(rb'\s*:\s*\{')
+
+
+def split_entries(body):
+    # Views over each element of a JSON array of entries, only their top level hash and clock are decoded
+    view = memoryview(body)
+    entries = []
+    depth = 0
+    start = None
+    entry_hash = clock = clock_start = None
+    hash_next = clock_next = False
+    for match in _tokens.finditer(body):
+        begin, end = match.span()
+        first = body[begin]
+        if first == _quote:
+            if depth != 2: continue
+            if hash_next:
+                entry_hash = json.loads(body[begin:end])
+                hash_next = False
+            elif end - begin == 6 and body[begin:end] == _hash_key:
+                hash_next = entry_hash is None and _string_value.match(body, end) is not None
+            elif end - begin == 7 and body[begin:end] == _clock_key:
+                clock_next = clock is None and _object_value.match(body, end) is not None
+        elif first in _opening:
+            depth += 1
+            if depth == 2:
+                start = begin
+            elif depth == 3 and clock_next:
+                clock_start, clock_next = begin, False
+        else:
+            depth -= 1
+            if depth == 2 and clock_start is not None:
+                clock = json.loads(body[clock_start:end])
+                clock = clock.get('time', 0), clock.get('id')
+                clock_start = None
+            elif depth == 1:
+                entries.append(Entry(view[start:end], entry_hash, clock))
+                entry_hash = clock = None
+    return entries
+
+
+@total_ordering
+class Entry():
+    __slots__ = ('__data', '__raw', '__hash', '__clock')
+
+    # Wraps a decoded oplog entry, or its raw JSON which is only parsed on first access
+    def __init__(self, data, entry_hash=None, clock=None):
+        if isinstance(data, (bytes, bytearray, memoryview, str)):
+            self.__data, self.__raw = None, data
+        else:
+            self.__data, self.__raw = data, None
+        self.__hash = entry_hash
+        self.__clock = clock
+
+    @property
+    def parsed(self):
+        return self.__data is not None
+
+    @property
+    def data(self):
+        if self.__data is None:
+            raw = self.__raw
+            self.__data = json.loads(raw.tobytes() if isinstance(raw, memoryview) else raw)
+            self.__raw = None
+        return self.__data
+
+    @property
+    def hash(self):
+        if self.__hash is None:
+            self.__hash = self.data.get('hash')
+        return self.__hash
+
+    @property
+    def payload(self):
+        return self.data.get('payload', {})
+
+    @property
+    def op(self):
+        return self.payload.get('op')
+
+    @property
+    def key(self):
+        return self.payload.get('key')
+
+    @property
+    def value(self):
+        return self.payload.get('value')
+
+    @property
+    def clock(self):
+        if self.__clock is None:
+            clock = self.data.get('clock') or {}
+            self.__clock = clock.get('time', 0), clock.get('id')
+        return self.__clock
+
+    @property
+    def identity(self):
+        return self.data.get('identity')
+
+    @property
+    def next(self):
+        return self.data.get('next', [])
+
+    def get(self, name, default=None):
+        return self.data.get(name, default)
+
+    def __getitem__(self, name):
+        return self.data[name]
+
+    def __contains__(self, name):
+        return name in self.data
+
+    def __eq__(self, other):
+        if not isinstance(other, Entry): return NotImplemented
+        return self.hash == other.hash
+
+    def __hash__(self):
+        return hash(self.hash)
+
+    def __lt__(self, other):
+        if not isinstance(other, Entry): return NotImplemented
+        # Lamport clock order, ties broken by writer id the way orbit-db sorts
+        (a_time, a_id), (b_time, b_id) = self.clock, other.clock
+        if a_time != b_time: return a_time < b_time
+        return (a_id or '') < (b_id or '')
+
+    def __repr__(self):
+        return f'Entry({self.hash})'
@@ -0,0 +1,71 @@
+import time
+
+
+class PendingWrite():
+    __slots__ = ('key', 'value', 'removed', 'entry_hash', 'confirmed_at')
+
+    def __init__(self, key, value, removed):
+        self.key = key
+        self.value = value
+        self.removed = removed
+        self.entry_hash = None
+        self.confirmed_at = None
+
+
+class WriteOverlay():
+    def __init__(self, ttl=0):
+        self.__ttl = ttl
+        self.__writes = {}
+        self.__hashes = {}
+
+    @property
+    def ttl(self):
+        return self.__ttl
+
+    def __len__(self):
+        return len(self.__writes)
+
+    def __contains__(self, key):
+        return self.lookup(key) is not None
+
+    def begin(self, key, value, removed=False):
+        # The newest write of a key shadows any older one still in flight
+        pending = PendingWrite(key, value, removed)
+        self.__writes[key] = pending
+        return pending
+
+    def confirm(self, pending, entry_hash):
+        if self.__writes.get(pending.key) is not pending: return
+        if not self.__ttl:
+            self.__forget(pending)
+            return
+        pending.entry_hash = entry_hash
+        pending.confirmed_at = time.monotonic()
+        if entry_hash: self.__hashes[entry_hash] = pending
+
+    def fail(self, pending):
+        if self.__writes.get(pending.key) is pending:
+            self.__forget(pending)
+
+    def lookup(self, key):
+        pending = self.__writes.get(key)
+        if pending is None or pending.confirmed_at is None: return pending
+        if time.monotonic() - pending.confirmed_at < self.__ttl: return pending
+        self.__forget(pending)
+        return None
+
+    def reconcile(self, entry_hash):
+        pending = self.__hashes.get(entry_hash)
+        if pending is None: return False
+        self.__forget(pending)
+        return True
+
+    def clear(self):
+        self.__writes.clear()
+        self.__hashes.clear()
+
+    def __forget(self, pending):
+        if self.__writes.get(pending.key) is pending:
+            del self.__writes[pending.key]
+        if pending.entry_hash is not None:
+            self.__hashes.pop(pending.entry_hash, None)
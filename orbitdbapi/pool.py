@@ -0,0 +1,88 @@
+import multiprocessing
+
+# Per worker process state, _init_worker keeps the settings and the db is opened by the first task
+_settings = None
+_client = None
+_db = None
+
+
+def _init_worker(config, dbname, open_options):
+    global _settings
+    _settings = config, dbname, open_options
+
+
+def _worker_db():
+    # Opened inside a task, so a failing open reaches the caller instead of respawning the worker
+    global _client, _db
+    if _db is None:
+        from .client import OrbitDbAPI
+        config, dbname, open_options = _settings
+        if _client is None: _client = OrbitDbAPI(**config)
+        _db = _client.db(dbname, **open_options)
+    return _db
+
+
+def _apply(task):
+    fn, items, transform = task
+    results = fn(_worker_db(), items)
+    if transform is None: return results
+    return [transform(result) for result in results]
+
+
+def _get_batch(db, keys):
+    return [db.get(key) for key in keys]
+
+
+def _iterator_page(db, query):
+    return db.iterator(**query)
+
+
+def _batches(items, size):
+    items = list(items)
+    return [items[start:start + size] for start in range(0, len(items), size)]
+
+
+class DBPool():
+    def __init__(self, dbname, processes=None, open_options=None, start_method='spawn', **kwargs):
+        if open_options is None: open_options = {}
+        self.__dbname = dbname
+        # httpx runs its sync client on an event loop, which does not survive a fork
+        context = multiprocessing.get_context(start_method)
+        # Every worker opens its own client, and with it its own connection pool
+        self.__pool = context.Pool(processes, _init_worker, (kwargs, dbname, open_options))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, tb):
+        self.close()
+
+    @property
+    def dbname(self):
+        return self.__dbname
+
+    def map(self, fn, tasks, transform=None):
+        return self.__pool.map(_apply, [(fn, task, transform) for task in tasks], chunksize=1)
+
+    def imap(self, fn, tasks, transform=None):
+        return self.__pool.imap(_apply, [(fn, task, transform) for task in tasks], chunksize=1)
+
+    def get_many(self, keys, transform=None, batch_size=64):
+        results = []
+        for batch in self.map(_get_batch, _batches(keys, batch_size), transform):
+            results.extend(batch)
+        return results
+
+    def iterator_pages(self, queries, transform=None):
+        return self.map(_iterator_page, queries, transform)
+
+    def imap_iterator_pages(self, queries, transform=None):
+        return self.imap(_iterator_page, queries, transform)
+
+    def close(self):
+        self.__pool.close()
+        self.__pool.join()
+
+    def terminate(self):
+        self.__pool.terminate()
+        self.__pool.join()
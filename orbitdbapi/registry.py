@@ -0,0 +1,119 @@
+import time
+import weakref
+
+
+class Registration():
+    __slots__ = ('ref', 'refs', 'idle_since', 'idle_handle', 'address', 'names', 'options')
+
+    def __init__(self, ref, address, names, options):
+        self.ref = ref
+        self.refs = 1
+        self.idle_since = None
+        self.idle_handle = None
+        self.address = address
+        self.names = names
+        self.options = options
+
+
+class HandleRegistry():
+    def __init__(self, idle_timeout=None):
+        self.__idle_timeout = idle_timeout
+        self.__registrations = {}
+        self.__names = {}
+        # Addresses of handles dropped without close(), waiting for their idle timeout
+        self.__abandoned = {}
+
+    @property
+    def idle_timeout(self):
+        return self.__idle_timeout
+
+    def __len__(self):
+        return len(self.__registrations)
+
+    def __contains__(self, handle):
+        return id(handle) in self.__registrations
+
+    def handles(self):
+        return [handle for handle in (reg.ref() for reg in self.__registrations.values()) if handle is not None]
+
+    def register(self, handle, address, *names, options=None):
+        key = id(handle)
+        ref = weakref.ref(handle, lambda _ref: self.__abandon(key))
+        self.__registrations[key] = Registration(ref, address, names, options)
+        self.__abandoned.pop(address, None)
+        for name in names:
+            self.__names[name] = key
+
+    def alias(self, handle, name):
+        reg = self.__registrations[id(handle)]
+        reg.names = (*reg.names, name)
+        self.__names[name] = id(handle)
+
+    def options(self, handle):
+        reg = self.__registrations.get(id(handle))
+        return None if reg is None else reg.options
+
+    def acquire(self, name):
+        key = self.__names.get(name)
+        if key is None: return None
+        reg = self.__registrations[key]
+        handle = reg.ref()
+        if handle is None: return None
+        reg.refs += 1
+        reg.idle_since = reg.idle_handle = None
+        return handle
+
+    def release(self, handle):
+        reg = self.__registrations.get(id(handle))
+        if reg is None: return True
+        reg.refs -= 1
+        if reg.refs > 0: return False
+        if self.__idle_timeout is None:
+            self.__forget(id(handle))
+        else:
+            reg.idle_since = time.monotonic()
+            reg.idle_handle = handle
+        return True
+
+    def remove(self, handle):
+        self.__forget(id(handle))
+
+    def expired(self):
+        # Addresses idle past the timeout, skipping any another registered handle still uses
+        if self.__idle_timeout is None: return []
+        deadline = time.monotonic() - self.__idle_timeout
+        handles = [
+            reg.idle_handle for reg in self.__registrations.values()
+            if reg.idle_since is not None and reg.idle_since <= deadline
+        ]
+        addresses = [address for address, idle_since in self.__abandoned.items() if idle_since <= deadline]
+        if not handles and not addresses: return []
+        for address in addresses:
+            del self.__abandoned[address]
+        expired = []
+        for handle in handles:
+            expired.append(self.__registrations[id(handle)].address)
+            self.__forget(id(handle))
+        in_use = {reg.address for reg in self.__registrations.values()}
+        return [address for address in dict.fromkeys(expired + addresses) if address not in in_use]
+
+    def clear(self):
+        handles = self.handles()
+        self.__registrations.clear()
+        self.__names.clear()
+        self.__abandoned.clear()
+        return handles
+
+    def __abandon(self, key):
+        reg = self.__registrations.get(key)
+        if reg is None: return
+        self.__forget(key)
+        if self.__idle_timeout is not None:
+            self.__abandoned[reg.address] = time.monotonic()
+
+    def __forget(self, key):
+        reg = self.__registrations.pop(key, None)
+        if reg is None: return
+        for name in reg.names:
+            if self.__names.get(name) == key:
+                del self.__names[name]
@@ -0,0 +1,48 @@
+import json
+import os
+import tempfile
+
+SNAPSHOT_VERSION = 1
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def entry_head(entries):
+    if not entries: return None
+    newest = max(entries, key=lambda entry: entry.get('clock', {}).get('time', 0))
+    return newest.get('hash')
+
+
+def write_snapshot(path, header, entries):
+    encode = json.JSONEncoder(separators=(',', ':')).encode
+    count = 0
+    # Written next to the target and swapped in, an interrupted export keeps the previous snapshot
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+    try:
+        with open(fd, 'w', encoding='utf-8') as fp:
+            fp.write(encode({**header, 'version': SNAPSHOT_VERSION}))
+            fp.write('\n')
+            for entry in entries:
+                fp.write(encode(entry))
+                fp.write('\n')
+                count += 1
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return count
+
+
+def read_snapshot(path):
+    # Every entry is decoded anyway, so a buffered read does as well as mapping the file
+    with open(path, 'rb') as fp:
+        line = fp.readline()
+        if not line:
+            raise SnapshotError(f'Snapshot {path} is empty')
+        header = json.loads(line)
+        if header.get('version') != SNAPSHOT_VERSION:
+            raise SnapshotError(f"Unsupported snapshot version {header.get('version')}")
+        entries = [json.loads(line) for line in fp]
+    return header, entries
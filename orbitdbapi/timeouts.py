@@ -0,0 +1,113 @@
+from collections import deque
+
+TIMEOUT_CLASSES = {
+    'get': 'read',
+    'raw': 'read',
+    'info': 'read',
+    'value': 'read',
+    'peers': 'read',
+    'dbs': 'read',
+    'searches': 'read',
+    'all': 'bulk',
+    'index': 'bulk',
+    'iterator': 'bulk',
+    'put': 'write',
+    'add': 'write',
+    'inc': 'write',
+    'remove': 'write',
+    'unload': 'write',
+    'find_peers': 'write',
+    'session': 'write',
+    'open': 'open'
+}
+
+# Bulk reads scale with the store and opens with replication. Writes keep their class timeout too, one cut short
+# on the client may still commit on the node and a retry would then write it twice
+ADAPTIVE_CLASSES = ('read',)
+
+
+def timeout_class(call):
+    kind = TIMEOUT_CLASSES.get(call.op)
+    if kind is not None: return kind
+    return 'read' if call.method == 'GET' else 'write'
+
+
+class LatencyWindow():
+    __slots__ = ('samples', 'ordered')
+
+    def __init__(self, size):
+        self.samples = deque(maxlen=size)
+        self.ordered = None
+
+    def __len__(self):
+        return len(self.samples)
+
+    def add(self, latency):
+        self.samples.append(latency)
+        self.ordered = None
+
+    def percentile(self, pct):
+        if self.ordered is None:
+            self.ordered = sorted(self.samples)
+        ordered = self.ordered
+        return ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))]
+
+
+class TimeoutPolicy():
+    def __init__(self, timeout=30, timeouts=None, adaptive=False, percentile=99, multiplier=3,
+                 min_timeout=0.5, window=256, min_samples=20, hedge=False, hedge_percentile=95):
+        if timeouts is None: timeouts = {}
+        self.__timeout = timeout
+        self.__timeouts = timeouts
+        self.__adaptive = adaptive
+        self.__percentile = percentile
+        self.__multiplier = multiplier
+        self.__min_timeout = min_timeout
+        self.__window = window
+        self.__min_samples = min_samples
+        self.__hedge = hedge
+        self.__hedge_percentile = hedge_percentile
+        self.__latencies = {}
+        self.hedged = 0
+
+    @property
+    def adaptive(self):
+        return self.__adaptive
+
+    @property
+    def hedge(self):
+        return self.__hedge
+
+    @property
+    def observing(self):
+        return self.__adaptive or self.__hedge
+
+    def timeout_for(self, call):
+        kind = timeout_class(call)
+        limit = self.__timeouts.get(kind, self.__timeout)
+        if not self.__adaptive or kind not in ADAPTIVE_CLASSES: return limit
+        latencies = self.__latencies.get(call.op or call.method)
+        if latencies is None or len(latencies) < self.__min_samples: return limit
+        adaptive = latencies.percentile(self.__percentile) * self.__multiplier
+        return min(limit, max(self.__min_timeout, adaptive))
+
+    def hedge_delay(self, call):
+        # Only idempotent reads that are not streamed into a sink can be sent twice
+        if not self.__hedge or call.method != 'GET' or call.sink is not None: return None
+        if timeout_class(call) != 'read': return None
+        latencies = self.__latencies.get(call.op or call.method)
+        if latencies is None or len(latencies) < self.__min_samples: return None
+        return latencies.percentile(self.__hedge_percentile)
+
+    def observe(self, call, latency):
+        key = call.op or call.method
+        latencies = self.__latencies.get(key)
+        if latencies is None:
+            latencies = self.__latencies[key] = LatencyWindow(self.__window)
+        latencies.add(latency)
+
+    def percentiles(self, pcts=(50, 90, 99)):
+        return {
+            key: {pct: latencies.percentile(pct) for pct in pcts}
+            for key, latencies in self.__latencies.items() if len(latencies)
+        }
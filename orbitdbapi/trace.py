@@ -0,0 +1,164 @@
+import json
+import threading
+import time
+from collections import namedtuple
+
+TraceRecord = namedtuple('TraceRecord', ['offset', 'method', 'endpoint', 'size', 'latency', 'cache', 'body'])
+
+
+def payload_size(kwargs):
+    if 'json' in kwargs:
+        return len(json.dumps(kwargs['json'], separators=(',', ':')))
+    data = kwargs.get('data')
+    return len(data) if isinstance(data, (bytes, str)) else 0
+
+
+class TraceRecorder():
+    def __init__(self, path):
+        self.__fp = open(path, 'w', encoding='utf-8')
+        self.__lock = threading.Lock()
+        self.__started = time.perf_counter()
+        self.__encode = json.JSONEncoder(separators=(',', ':')).encode
+
+    clock = staticmethod(time.perf_counter)
+
+    def record(self, method, endpoint, size, latency, cache=None, body=None):
+        offset = time.perf_counter() - latency - self.__started
+        line = self.__encode([round(offset, 6), method, endpoint, size, round(latency, 6), cache, body])
+        with self.__lock:
+            self.__fp.write(line)
+            self.__fp.write('\n')
+
+    def close(self):
+        with self.__lock:
+            if not self.__fp.closed:
+                self.__fp.close()
+
+
+def read_trace(path):
+    with open(path, encoding='utf-8') as fp:
+        return [TraceRecord(*json.loads(line)) for line in fp if line.strip()]
+
+
+def replayable(record):
+    # Cache hits never reached the server and event streams never finish
+    return record.cache != 'hit' and '/events/' not in f'/{record.endpoint}'
+
+
+def replay_kwargs(record, index):
+    if record.body is not None:
+        return {'json': record.body}
+    if not record.size:
+        return {}
+    if record.endpoint.endswith('/inc'):
+        return {'json': {'val': 1}}
+    key = f'replay-{index}'
+    # Pads the document out to roughly the recorded payload size
+    padding = 'x' * max(record.size - 48 - 2 * len(key), 0)
+    return {'json': {'key': key, '_id': key, 'value': padding}}
+
+
+def replay(client, path, speed=1.0):
+    results = []
+    started = time.perf_counter()
+    for index, record in enumerate(read_trace(path)):
+        if not replayable(record): continue
+        if speed:
+            delay = record.offset / speed - (time.perf_counter() - started)
+            if delay > 0: time.sleep(delay)
+        results.append(_replay_one(client, record, index))
+    return results
+
+
+def _replay_one(client, record, index):
+    sent = time.perf_counter()
+    try:
+        res = client._do_request(record.method, client._url(record.endpoint), **replay_kwargs(record, index))
+        status = res.status_code
+    except Exception as ex:
+        status = type(ex).__name__
+    return record, time.perf_counter() - sent, status
+
+
+async def async_replay(client, path, speed=1.0):
+    import asyncio
+    started = time.perf_counter()
+
+    async def send(record, index):
+        if speed:
+            delay = record.offset / speed - (time.perf_counter() - started)
+            if delay > 0: await asyncio.sleep(delay)
+        sent = time.perf_counter()
+        try:
+            res = await client._do_request(record.method, client._url(record.endpoint), **replay_kwargs(record, index))
+            status = res.status_code
+        except Exception as ex:
+            status = type(ex).__name__
+        return record, time.perf_counter() - sent, status
+
+    return await asyncio.gather(*[
+        send(record, index) for index, record in enumerate(read_trace(path)) if replayable(record)
+    ])
+
+
+def summarize(results):
+    summary = {}
+    for record, latency, status in results:
+        original, replayed, errors = summary.setdefault(f'{record.method} {record.endpoint}', ([], [], []))
+        original.append(record.latency)
+        replayed.append(latency)
+        if not isinstance(status, int) or status >= 400: errors.append(status)
+    return {
+        endpoint: {
+            'count': len(original),
+            'errors': len(errors),
+            'original_mean': sum(original) / len(original),
+            'replay_mean': sum(replayed) / len(replayed)
+        } for endpoint, (original, replayed, errors) in summary.items()
+    }
+
+
+def replay_arguments(parser):
+    parser.add_argument('trace', help='Trace file written by the trace=<path> client option')
+    parser.add_argument('--speed', type=float, default=1.0, help='Time scale, 0 replays as fast as possible')
+    parser.add_argument('--async', dest='use_async', action='store_true', help='Replay concurrently with the async client')
+
+
+def run_replay(args):
+    import asyncio
+    import sys
+    if args.use_async:
+        from .asyncClient import OrbitDbAPI
+
+        async def run():
+            client = OrbitDbAPI(base_url=args.base_url, timeout=args.timeout)
+            try:
+                return await async_replay(client, args.trace, args.speed)
+            finally:
+                await client.close()
+        results = asyncio.run(run())
+    else:
+        from .client import OrbitDbAPI
+        client = OrbitDbAPI(base_url=args.base_url, timeout=args.timeout)
+        try:
+            results = replay(client, args.trace, args.speed)
+        finally:
+            client.close()
+    json.dump(summarize(results), sys.stdout, indent=2)
+    print()
+
+
+def main(argv=None):
+    import argparse
+    import logging
+    import sys
+    parser = argparse.ArgumentParser(description='Replay a recorded orbitdbapi request trace')
+    replay_arguments(parser)
+    parser.add_argument('--base-url', required=True)
+    parser.add_argument('--timeout', type=float, default=30)
+    args = parser.parse_args(argv)
+    logging.basicConfig(stream=sys.stderr, level=logging.WARNING)
+    run_replay(args)
+
+if __name__ == '__main__':
+    main()
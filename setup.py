@@ -16,6 +16,9 @@ setup(
         'httpx == 0.7.8',
         'sseclient-py >= 1.7'
         ],
+    extras_require={
+        'compression': ['brotli', 'zstandard']
+    },
     classifiers=[
         'Programming Language :: Python :: 3',
         'License :: OSI Approved :: MIT License',
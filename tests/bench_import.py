@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+import os
+import subprocess
+import sys
+import time
+
+runs = int(os.environ.get('IMPORT_BENCHMARK_RUNS', 20))
+import_budget = float(os.environ.get('IMPORT_BUDGET_MS', 20))
+client_budget = float(os.environ.get('CLIENT_BUDGET_MS', 250))
+
+
+def measure(code):
+    # Best of several fresh interpreters, so caches and noise are excluded
+    best = None
+    for _c in range(runs):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, '-c', code], check=True)
+        elapsed = (time.perf_counter() - started) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    baseline = measure('pass')
+    results = {
+        'import orbitdbapi': (measure('import orbitdbapi'), import_budget),
+        'import version': (measure('from orbitdbapi import version'), import_budget),
+        'create client': (measure(
+            "import orbitdbapi; orbitdbapi.OrbitDbAPI(base_url='http://localhost:3000').close()"
+        ), client_budget),
+    }
+    failed = False
+    for name, (elapsed, budget) in results.items():
+        cost = elapsed - baseline
+        failed = failed or cost > budget
+        print(f'{name:>18}: {cost:7.1f} ms over interpreter start (budget {budget:.0f} ms)')
+    eager = subprocess.run(
+        [sys.executable, '-c', "import sys, orbitdbapi; print(' '.join(m for m in ('httpx', 'sseclient', 'pprint', 'copy') if m in sys.modules))"],
+        check=True, capture_output=True, text=True).stdout.strip()
+    if eager:
+        print(f'Eagerly imported: {eager}')
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
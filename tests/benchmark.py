@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+import json
+import os
+import time
+import timeit
+import tracemalloc
+from urllib.parse import quote as urlquote
+
+from orbitdbapi.core import ApiCore, DBCore, encode_key
+from orbitdbapi.entry import split_entries
+
+number = int(os.environ.get('BENCHMARK_NUMBER', 200000))
+
+
+class NullClient(ApiCore):
+    # Answers every call without any I/O so only the client overhead is timed
+    def _drive(self, op):
+        try:
+            call = next(op)
+            while True:
+                call = op.send({'hash': call.url} if call.method == 'POST' else call.url)
+        except StopIteration as ex:
+            return ex.value
+
+
+def legacy_get(base_url, id_safe, item):
+    # URL assembly as done per call before handles precomputed their URLs
+    item = str(item)
+    endpoint = '/'.join(['db', id_safe, item])
+    return '/'.join([base_url, endpoint])
+
+
+def main():
+    client = NullClient(base_url='http://localhost:3000', use_db_cache=False)
+    db = DBCore(client, {
+        'dbname': 'benchmark',
+        'id': '/orbitdb/zdpuAmrcSRUhkQcnRQ6p4bphs7DJWGBkqczSGFYynX6moTcDL/benchmark',
+        'type': 'keyvalue',
+        'capabilities': ['get', 'put', 'remove']
+    })
+    id_safe = urlquote(db.id, safe='')
+    item_url = client._url(f'db/{id_safe}/')
+    results = {
+        'legacy get url': timeit.timeit(
+            lambda: legacy_get(client.base_url, id_safe, 'key1234'), number=number),
+        'precomputed get url': timeit.timeit(
+            lambda: item_url + encode_key('key1234'), number=number),
+        'legacy dashed url': timeit.timeit(
+            lambda: legacy_get(client.base_url, id_safe, 'key-1234'), number=number),
+        'precomputed dashed url': timeit.timeit(
+            lambda: item_url + encode_key('key-1234'), number=number),
+        'get': timeit.timeit(lambda: db.get('key1234'), number=number),
+        'put': timeit.timeit(lambda: db.put({'key': 'key1234', 'value': 1}), number=number),
+    }
+    for name, seconds in results.items():
+        print(f'{name:>24}: {seconds / number * 1e6:.3f} us/call')
+
+    params = db.params
+    tracemalloc.start()
+    handles = [DBCore(client, params) for _c in range(1000)]
+    size, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{'handle memory':>24}: {size / len(handles):.0f} bytes/handle")
+
+    entries = [{
+        'hash': f'zdpu{n:044d}',
+        'id': db.id,
+        'payload': {'op': 'ADD', 'key': None, 'value': {'n': n}},
+        'next': [f'zdpu{n - 1:044d}'],
+        'refs': [],
+        'v': 2,
+        'clock': {'id': '04' + 'ab' * 64, 'time': n},
+        'key': '04' + 'cd' * 64,
+        'identity': {'id': '03' + 'ef' * 32, 'publicKey': '04' + 'ab' * 64, 'type': 'orbitdb'},
+        'sig': '30' * 70
+    } for n in range(10000)]
+    body = json.dumps(entries, separators=(',', ':')).encode()
+    for name, scan in (('decoded log', json.loads), ('entry views', split_entries)):
+        started = time.perf_counter()
+        result = scan(body)
+        seconds = time.perf_counter() - started
+        del result
+        tracemalloc.start()
+        result = scan(body)
+        size, _peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f'{name:>24}: {size / len(result):.0f} bytes/entry, {seconds / len(result) * 1e6:.1f} us/entry')
+
+
+if __name__ == '__main__':
+    main()
@@ -81,7 +81,7 @@ class KVStoreTestCase(unittest.TestCase):
         self.assertDictContainsSubset(self.localKV, await self.kevalue_test.all())
 
     async def verifyDelete(self):
-        remoteKeys = await self.kevalue_test.all().keys()
+        remoteKeys = (await self.kevalue_test.all()).keys()
         self.assertTrue(all(k not in remoteKeys for k in self.deletedKeys))
 
     async def remove(self, delk):
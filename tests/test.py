@@ -1,15 +1,18 @@
 #!/usr/bin/env python
+import io
 import json
 import logging
 import os
 import random
 import string
 import sys
+import tempfile
 import unittest
 from pprint import pformat
 from time import sleep
 
 from orbitdbapi.client import OrbitDbAPI
+from orbitdbapi.entry import Entry
 
 base_url = os.environ.get('ORBIT_DB_HTTP_API_URL')
 timeout = int(os.environ.get('ORBIT_DB_HTTP_API_TIMEOUT', 120))
@@ -165,6 +168,98 @@ class DocStoreTestCase(unittest.TestCase):
         self.client.close()
 
 
+class EventLogRawTestCase(unittest.TestCase):
+    def setUp(self):
+        self.client = OrbitDbAPI(
+            base_url=base_url,
+            use_db_cache=False,
+            # TODO: See https://github.com/encode/httpx/issues/96
+            headers={'connection': 'close'},
+            timeout=timeout
+        )
+        self.event_test = self.client.db('event_raw_test', json={
+                                         'create': True, 'type': 'eventlog'})
+
+    def runTest(self):
+        entry_hash = self.event_test.add({'value': randString(k=100, both=True)})
+        self.assertEqual(self.event_test.get_raw(entry_hash),
+                         json.loads(self.event_test.get_raw(entry_hash, raw_bytes=True)))
+        sink = io.BytesIO()
+        size = self.event_test.iterator_raw(sink=sink, limit=-1)
+        self.assertEqual(size, len(sink.getvalue()))
+        self.assertEqual(self.event_test.iterator_raw(limit=-1),
+                         json.loads(sink.getvalue()))
+        entries = self.event_test.iterator_entries(limit=-1)
+        self.assertEqual([entry.data for entry in entries], self.event_test.iterator(limit=-1))
+        self.assertEqual(entry_hash, max(entries).hash)
+        self.assertEqual(entries[0], Entry(self.event_test.get_raw(entries[0].hash, raw_bytes=True)))
+
+    def tearDown(self):
+        self.event_test.unload()
+        self.client.close()
+
+
+class WriteCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.client = OrbitDbAPI(
+            base_url=base_url,
+            use_db_cache=True,
+            # TODO: See https://github.com/encode/httpx/issues/96
+            headers={'connection': 'close'},
+            timeout=timeout
+        )
+        self.kevalue_test = self.client.db('keyvalue_cache_test', json={
+                                           'create': True, 'type': 'keyvalue'})
+        self.docstore_test = self.client.db('docstore_cache_test', json={
+                                            'create': True, 'type': 'docstore'})
+
+    def runTest(self):
+        k = randString()
+        v = randString(k=100, both=True)
+        self.kevalue_test.put({'key': k, 'value': v})
+        self.assertEqual(v, self.kevalue_test.cache_get(k))
+        self.assertEqual(self.kevalue_test.get(k, cache=False), self.kevalue_test.get(k))
+        item = {'_id': k, 'value': v}
+        self.docstore_test.put(item)
+        self.assertEqual([item], self.docstore_test.cache_get(k))
+        self.kevalue_test.remove(k)
+        self.assertIsNone(self.kevalue_test.cache_get(k))
+        self.assertEqual(0, self.kevalue_test.pending_writes)
+
+    def tearDown(self):
+        self.kevalue_test.unload()
+        self.docstore_test.unload()
+        self.client.close()
+
+
+class SnapshotTestCase(unittest.TestCase):
+    def setUp(self):
+        self.client = OrbitDbAPI(
+            base_url=base_url,
+            # TODO: See https://github.com/encode/httpx/issues/96
+            headers={'connection': 'close'},
+            timeout=timeout
+        )
+        self.event_test = self.client.db('event_snapshot_test', json={
+                                         'create': True, 'type': 'eventlog'})
+        self.snapshot = tempfile.NamedTemporaryFile(suffix='.jsonl', delete=False)
+        self.snapshot.close()
+
+    def runTest(self):
+        hashes = [self.event_test.add({'value': randString()}) for _c in range(1, 10)]
+        self.event_test.export_snapshot(self.snapshot.name)
+        hashes.append(self.event_test.add({'value': randString()}))
+        self.event_test.clear_cache()
+        entries = self.event_test.load_snapshot(self.snapshot.name)
+        self.assertTrue(set(hashes).issubset(entry['hash'] for entry in entries))
+        self.assertTrue(all(self.event_test.cache_get(h) for h in hashes))
+
+    def tearDown(self):
+        os.unlink(self.snapshot.name)
+        self.event_test.unload()
+        self.client.close()
+
+
 if __name__ == '__main__':
     loglvl = int(os.environ.get('LOG_LEVEL', 15))
     print(f'Log level: {loglvl}')
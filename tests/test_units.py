@@ -0,0 +1,878 @@
+#!/usr/bin/env python
+# Checks that need no orbit-db node, the transports are replaced where a call would go out
+import asyncio
+import contextlib
+import gc
+import gzip
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import quote
+
+import httpx
+
+from orbitdbapi.__main__ import RateLimiter, main, open_options, parser, percentile
+from orbitdbapi.asyncClient import OrbitDbAPI as AsyncOrbitDbAPI
+from orbitdbapi.asyncDB import DB as AsyncDB
+from orbitdbapi.client import OrbitDbAPI
+from orbitdbapi.compression import SUPPORTED_DECODERS, accept_encoding, compress_body
+from orbitdbapi.core import (
+    CAP_ADD, CAP_GET, CAP_PUT, ApiCore, Call, CapabilityError, SessionError, WriteAccessError, capability_mask
+)
+from orbitdbapi.db import DB
+from orbitdbapi.entry import Entry, split_entries
+from orbitdbapi.pool import DBPool
+from orbitdbapi.registry import HandleRegistry
+from orbitdbapi.snapshot import SnapshotError, read_snapshot, write_snapshot
+from orbitdbapi.timeouts import TimeoutPolicy, timeout_class
+from orbitdbapi.trace import TraceRecord, payload_size, read_trace, replay_kwargs, replayable
+
+base_url = 'http://localhost:3000'
+
+
+def kv_params(**kwargs):
+    return {
+        'dbname': 'units',
+        'id': '/orbitdb/zdpuAmrcSRUhkQcnRQ6p4bphs7DJWGBkqczSGFYynX6moTcDL/units',
+        'type': 'keyvalue',
+        'capabilities': ['get', 'put', 'remove'],
+        **kwargs
+    }
+
+
+class StalledClient(AsyncOrbitDbAPI):
+    # Never answers, every call stays in flight until it is cancelled
+    async def _perform(self, call, streams=None):
+        await asyncio.Event().wait()
+
+
+class InterruptedClient(OrbitDbAPI):
+    def _perform(self, call, streams=None):
+        raise KeyboardInterrupt()
+
+
+class NodeClient(ApiCore):
+    _db_class = DB
+
+    # Answers each call with the result set for its op, kv_params for opens and an empty result otherwise
+    def __init__(self, **kwargs):
+        super().__init__(base_url=base_url, **kwargs)
+        self.calls = []
+        self.results = {'open': kv_params()}
+        self.headers = {}
+
+    def _set_header(self, name, value):
+        if value is None:
+            self.headers.pop(name, None)
+        else:
+            self.headers[name] = value
+
+    def _drive(self, op):
+        result = None
+        try:
+            while True:
+                call = op.send(result)
+                self.calls.append(call.op)
+                result = self.results.get(call.op, {})
+        except StopIteration as ex:
+            return ex.value
+
+
+class Handle():
+    pass
+
+
+class EventNode(BaseHTTPRequestHandler):
+    # Just enough of a node for waits: opens, a peers list and a peer event stream
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def reply(self, result, status=200):
+        body = json.dumps(result).encode()
+        self.send_response(status)
+        self.send_header('content-type', 'application/json')
+        self.send_header('content-length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('content-length', 0)))
+        self.server.sessions.update(self.headers.get_all('x-orbitdb-session') or [])
+        self.reply(kv_params())
+
+    def do_DELETE(self):
+        server = self.server
+        server.deleted.append(self.path)
+        self.reply({'error': 'failed'} if server.fail_deletes else {}, 500 if server.fail_deletes else 200)
+
+    def do_GET(self):
+        server = self.server
+        key = self.path.rsplit('/', 1)[-1]
+        if key in server.values:
+            return self.reply(server.values[key])
+        if '/events/' not in self.path:
+            server.peer_checks += 1
+            return self.reply(['peer'] if server.peer_joined.is_set() else [])
+        server.streams += 1
+        self.send_response(200)
+        self.send_header('content-type', 'text/event-stream')
+        self.send_header('connection', 'close')
+        self.end_headers()
+        self.wfile.flush()
+        if server.event_delay is None: return
+        time.sleep(server.event_delay)
+        server.peer_joined.set()
+        self.wfile.write(b'event: peer\ndata: {"peer": "peer"}\n\n')
+        self.wfile.flush()
+        server.closing.wait(5)
+
+
+class EventNodeTestCase(unittest.TestCase):
+    event_delay = None
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), EventNode)
+        self.server.daemon_threads = True
+        self.server.event_delay = self.event_delay
+        self.server.peer_checks = self.server.streams = 0
+        self.server.values = {}
+        self.server.sessions = set()
+        self.server.deleted = []
+        self.server.fail_deletes = False
+        self.server.peer_joined = threading.Event()
+        self.server.closing = threading.Event()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = f'http://127.0.0.1:{self.server.server_address[1]}'
+
+    def tearDown(self):
+        self.server.closing.set()
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class ClosedStreamWaitTestCase(EventNodeTestCase):
+    def runTest(self):
+        client = OrbitDbAPI(base_url=self.base_url)
+        db = client.db('kv')
+        started = time.monotonic()
+        with self.assertRaises(TimeoutError):
+            db.wait_for_peers(timeout=1, interval=0.2)
+        # One stream for the whole wait, and the backoff still applies once it has ended
+        self.assertGreaterEqual(time.monotonic() - started, 0.9)
+        self.assertEqual(1, self.server.streams)
+        self.assertLessEqual(self.server.peer_checks, 4)
+        client.close()
+
+
+class StreamEventWaitTestCase(EventNodeTestCase):
+    event_delay = 0.3
+
+    def runTest(self):
+        client = OrbitDbAPI(base_url=self.base_url)
+        db = client.db('kv')
+        started = time.monotonic()
+        self.assertEqual(['peer'], db.wait_for_peers(timeout=5, interval=0.1, max_interval=0.1))
+        self.assertLess(time.monotonic() - started, 2)
+        self.assertEqual(1, self.server.streams)
+        client.close()
+
+
+class AsyncStreamEventWaitTestCase(EventNodeTestCase):
+    event_delay = 0.3
+
+    def runTest(self):
+        async def run():
+            client = AsyncOrbitDbAPI(base_url=self.base_url)
+            db = await client.db('kv')
+            self.assertEqual(['peer'], await db.wait_for_peers(timeout=5, interval=0.1, max_interval=0.1))
+            self.assertEqual(1, self.server.streams)
+            await client.close()
+        asyncio.run(run())
+
+
+class AsyncClosedStreamWaitTestCase(EventNodeTestCase):
+    def runTest(self):
+        async def run():
+            client = AsyncOrbitDbAPI(base_url=self.base_url)
+            db = await client.db('kv')
+            with self.assertRaises(TimeoutError):
+                await db.wait_for_peers(timeout=1, interval=0.2)
+            self.assertEqual(1, self.server.streams)
+            self.assertLessEqual(self.server.peer_checks, 4)
+            await client.close()
+        asyncio.run(run())
+
+
+class AsyncEventStreamCloseTestCase(EventNodeTestCase):
+    event_delay = 0.1
+
+    def runTest(self):
+        async def run():
+            client = AsyncOrbitDbAPI(base_url=self.base_url)
+            db = await client.db('kv')
+            received = []
+            async def consume():
+                async for event in db.events('peer'):
+                    received.append(event.json)
+            task = asyncio.ensure_future(consume())
+            while not received:
+                await asyncio.sleep(0.05)
+            # The node keeps the stream open, closing the client has to end the pending read
+            started = time.monotonic()
+            await client.close()
+            await asyncio.wait_for(task, 1)
+            self.assertLess(time.monotonic() - started, 1)
+            self.assertEqual([{'peer': 'peer'}], received)
+        asyncio.run(run())
+
+
+class DBPoolTestCase(EventNodeTestCase):
+    def runTest(self):
+        self.server.values = {'a': 1, 'b': 2, 'c': 3}
+        with DBPool('kv', processes=2, base_url=self.base_url, timeout=5) as pool:
+            self.assertEqual([1, 2, 3, 1], pool.get_many(['a', 'b', 'c', 'a'], batch_size=2))
+            self.assertEqual(['1', '2', '3'], pool.get_many(['a', 'b', 'c'], transform=str))
+
+
+class DBPoolOpenErrorTestCase(unittest.TestCase):
+    def runTest(self):
+        # Nothing listens on the port, the failed open has to reach the caller
+        with DBPool('kv', processes=1, base_url='http://127.0.0.1:1', timeout=1) as pool:
+            with self.assertRaises(OSError):
+                pool.get_many(['a'])
+
+
+
+class SessionTestCase(unittest.TestCase):
+    def runTest(self):
+        client = NodeClient()
+        session_id = client.create_session()
+        self.assertEqual({'X-Orbitdb-Session': session_id}, client.headers)
+        with self.assertRaises(SessionError):
+            client.create_session()
+        db = client.db('kv')
+        self.assertIs(db, client.db('kv'))
+        client.destroy_session()
+        # The node drops the session's dbs, so the next db() opens it again
+        self.assertIsNone(client.session_id)
+        self.assertEqual({}, client.headers)
+        self.assertIsNot(db, client.db('kv'))
+        self.assertEqual(['session', 'open', 'session', 'open'], client.calls)
+        client.destroy_session()
+        self.assertEqual(4, len(client.calls))
+
+
+class SessionContextTestCase(EventNodeTestCase):
+    def runTest(self):
+        with OrbitDbAPI(base_url=self.base_url) as client:
+            session_id = client.session_id
+            client.db('kv')
+            self.assertEqual(session_id, client.session.headers['x-orbitdb-session'])
+        self.assertNotIn('x-orbitdb-session', client.session.headers)
+        self.assertEqual({session_id}, self.server.sessions)
+        self.assertEqual([f'/sessions/{session_id}'], self.server.deleted)
+        # A failing session delete does not hide the error raised in the block
+        self.server.fail_deletes = True
+        with self.assertRaises(KeyError), self.assertLogs(client.logger, level='ERROR'):
+            with OrbitDbAPI(base_url=self.base_url):
+                raise KeyError('body')
+        with self.assertRaises(httpx.exceptions.HTTPError):
+            with OrbitDbAPI(base_url=self.base_url):
+                pass
+
+        async def run():
+            self.server.fail_deletes = False
+            async with AsyncOrbitDbAPI(base_url=self.base_url) as client:
+                session_id = client.session_id
+                self.assertEqual(session_id, client.raw_client.headers['x-orbitdb-session'])
+            self.assertNotIn('x-orbitdb-session', client.raw_client.headers)
+            self.assertEqual(f'/sessions/{session_id}', self.server.deleted[-1])
+            self.server.fail_deletes = True
+            with self.assertRaises(KeyError):
+                async with AsyncOrbitDbAPI(base_url=self.base_url):
+                    raise KeyError('body')
+            await client.close()
+        asyncio.run(run())
+
+
+class OverlayCancelTestCase(unittest.TestCase):
+    def runTest(self):
+        async def run():
+            client = StalledClient(base_url=base_url)
+            db = AsyncDB(client, kv_params())
+            task = asyncio.ensure_future(db.put({'key': 'k', 'value': 1}))
+            await asyncio.sleep(0)
+            self.assertEqual(1, db.pending_writes)
+            task.cancel()
+            # Held like a caller logging it would, the traceback keeps the frames alive
+            errors = []
+            try:
+                await task
+            except asyncio.CancelledError as ex:
+                errors.append(ex)
+            self.assertEqual(0, db.pending_writes)
+            try:
+                await asyncio.wait_for(db.remove('k'), 0.01)
+            except asyncio.TimeoutError as ex:
+                errors.append(ex)
+            self.assertEqual(0, db.pending_writes)
+            self.assertEqual(2, len(errors))
+            await client.close()
+        asyncio.run(run())
+
+
+class OverlayInterruptTestCase(unittest.TestCase):
+    def runTest(self):
+        client = InterruptedClient(base_url=base_url)
+        db = DB(client, kv_params())
+        errors = []
+        try:
+            db.put({'key': 'k', 'value': 1})
+        except KeyboardInterrupt as ex:
+            errors.append(ex)
+        self.assertEqual(0, db.pending_writes)
+        self.assertEqual(1, len(errors))
+        client.close()
+
+
+class OverlayReadTestCase(unittest.TestCase):
+    def runTest(self):
+        async def run():
+            client = StalledClient(base_url=base_url)
+            db = AsyncDB(client, kv_params(), use_db_cache=False)
+            docs = AsyncDB(client, kv_params(type='docstore', options={'indexBy': '_id'}), use_db_cache=False)
+            # Reads resolve to the writes still in flight without going to the node
+            first = asyncio.ensure_future(db.put({'key': 'k', 'value': 1}))
+            await asyncio.sleep(0)
+            self.assertEqual(1, await db.get('k'))
+            second = asyncio.ensure_future(db.put({'key': 'k', 'value': 2}))
+            await asyncio.sleep(0)
+            self.assertEqual(2, await db.get('k'))
+            # The older write ending does not drop the newer one
+            first.cancel()
+            await asyncio.gather(first, return_exceptions=True)
+            self.assertEqual(2, await db.get('k'))
+            removal = asyncio.ensure_future(db.remove('k'))
+            await asyncio.sleep(0)
+            self.assertIsNone(await db.get('k'))
+            doc = {'_id': 'd', 'value': 1}
+            writes = [asyncio.ensure_future(docs.put(doc))]
+            await asyncio.sleep(0)
+            self.assertEqual([doc], await docs.get('d'))
+            writes.append(asyncio.ensure_future(docs.remove('d')))
+            await asyncio.sleep(0)
+            self.assertEqual([], await docs.get('d'))
+            for task in (second, removal, *writes):
+                task.cancel()
+            await asyncio.gather(second, removal, *writes, return_exceptions=True)
+            self.assertEqual(0, db.pending_writes + docs.pending_writes)
+            await client.close()
+        asyncio.run(run())
+
+
+class OverlayTtlTestCase(unittest.TestCase):
+    def runTest(self):
+        client = NodeClient()
+        client.results['put'] = {'hash': 'zdpuA'}
+        db = DB(client, kv_params(), use_db_cache=False, overlay_ttl=60)
+        db.put({'key': 'k', 'value': 1})
+        # Confirmed writes stay readable until the entry is seen replicated or the ttl runs out
+        self.assertEqual(1, db.pending_writes)
+        self.assertEqual(1, db.get('k'))
+        self.assertEqual(['put'], client.calls)
+        self.assertFalse(db.reconcile('zdpuB'))
+        self.assertTrue(db.reconcile('zdpuA'))
+        self.assertEqual(0, db.pending_writes)
+        db.get('k')
+        self.assertEqual(['put', 'get'], client.calls)
+        # Without a ttl the write is dropped from the overlay once confirmed
+        plain = DB(client, kv_params(), use_db_cache=False)
+        plain.put({'key': 'k', 'value': 1})
+        self.assertEqual(0, plain.pending_writes)
+
+
+class TimeoutClassTestCase(unittest.TestCase):
+    def runTest(self):
+        self.assertEqual('read', timeout_class(Call('GET', 'u', op='get')))
+        self.assertEqual('bulk', timeout_class(Call('GET', 'u', op='all')))
+        self.assertEqual('bulk', timeout_class(Call('GET', 'u', op='iterator')))
+        self.assertEqual('write', timeout_class(Call('POST', 'u', op='put')))
+        self.assertEqual('open', timeout_class(Call('POST', 'u', op='open')))
+        self.assertEqual('read', timeout_class(Call('GET', 'u')))
+        self.assertEqual('write', timeout_class(Call('DELETE', 'u')))
+        policy = TimeoutPolicy(30, {'bulk': 300, 'open': 60})
+        self.assertEqual(30, policy.timeout_for(Call('GET', 'u', op='get')))
+        self.assertEqual(300, policy.timeout_for(Call('GET', 'u', op='all')))
+        self.assertEqual(60, policy.timeout_for(Call('POST', 'u', op='open')))
+
+
+class AdaptiveTimeoutTestCase(unittest.TestCase):
+    def runTest(self):
+        policy = TimeoutPolicy(30, adaptive=True, multiplier=3, min_timeout=0.5, min_samples=5)
+        get = Call('GET', 'u', op='get')
+        for _c in range(4):
+            policy.observe(get, 0.1)
+        self.assertEqual(30, policy.timeout_for(get))
+        policy.observe(get, 0.1)
+        self.assertAlmostEqual(0.5, policy.timeout_for(get))
+        for _c in range(5):
+            policy.observe(get, 0.4)
+        self.assertAlmostEqual(1.2, policy.timeout_for(get))
+        for _c in range(10):
+            policy.observe(get, 20)
+        self.assertEqual(30, policy.timeout_for(get))
+        # Bulk reads keep the class timeout however fast they were
+        bulk = Call('GET', 'u', op='all')
+        for _c in range(10):
+            policy.observe(bulk, 0.1)
+        self.assertEqual(30, policy.timeout_for(bulk))
+        self.assertEqual(30, TimeoutPolicy(30, min_samples=1).timeout_for(get))
+        # Writes cut short could still commit on the node, so they never get adaptive deadlines
+        for op in ('put', 'add', 'inc', 'remove'):
+            write = Call('POST', 'u', op=op)
+            for _c in range(10):
+                policy.observe(write, 0.1)
+            self.assertEqual(30, policy.timeout_for(write))
+
+
+class SyncHedgeTestCase(unittest.TestCase):
+    def runTest(self):
+        with self.assertLogs('orbitdbapi.client', level='WARNING'):
+            OrbitDbAPI(base_url=base_url, hedge_reads=True)
+
+
+class HedgeDelayTestCase(unittest.TestCase):
+    def runTest(self):
+        get = Call('GET', 'u', op='get')
+        policy = TimeoutPolicy(30, hedge=True, min_samples=3, hedge_percentile=50)
+        policy.observe(get, 0.1)
+        self.assertIsNone(policy.hedge_delay(get))
+        policy.observe(get, 0.2)
+        policy.observe(get, 0.3)
+        self.assertAlmostEqual(0.2, policy.hedge_delay(get))
+        for call in (Call('POST', 'u', op='put'), Call('GET', 'u', op='all'), Call('GET', 'u', sink=object(), op='get')):
+            for _c in range(3):
+                policy.observe(call, 0.1)
+            self.assertIsNone(policy.hedge_delay(call))
+        unhedged = TimeoutPolicy(30, min_samples=1)
+        unhedged.observe(get, 0.1)
+        self.assertIsNone(unhedged.hedge_delay(get))
+
+
+class HedgedReadTestCase(unittest.TestCase):
+    def runTest(self):
+        async def run():
+            policy = TimeoutPolicy(30, hedge=True, min_samples=1)
+            policy.observe(Call('GET', 'u', op='get'), 0.01)
+            client = AsyncOrbitDbAPI(base_url=base_url, timeout_policy=policy)
+            db = AsyncDB(client, kv_params())
+            urls = []
+
+            async def request(method, url, **kwargs):
+                urls.append(url)
+                if len(urls) == 1: await asyncio.sleep(10)
+                return httpx.AsyncResponse(200, content=b'1', request=httpx.AsyncRequest(method, url))
+            client.raw_client.request = request
+            # The cancelled loser is not an api failure
+            with self.assertNoLogs(level='ERROR'):
+                self.assertEqual(1, await db.get('k', cache=False))
+                await asyncio.sleep(0.01)
+            self.assertEqual(2, len(urls))
+            self.assertEqual(1, policy.hedged)
+            await client.close()
+        asyncio.run(run())
+
+
+
+class HandleRegistryTestCase(unittest.TestCase):
+    def runTest(self):
+        registry = HandleRegistry()
+        handle = Handle()
+        registry.register(handle, 'address', 'name')
+        registry.alias(handle, 'alias')
+        self.assertIs(handle, registry.acquire('name'))
+        self.assertIs(handle, registry.acquire('alias'))
+        self.assertFalse(registry.release(handle))
+        self.assertFalse(registry.release(handle))
+        self.assertTrue(registry.release(handle))
+        self.assertIsNone(registry.acquire('name'))
+        self.assertIsNone(registry.acquire('alias'))
+        self.assertEqual(0, len(registry))
+        self.assertEqual([], registry.expired())
+
+
+class HandleExpiryTestCase(unittest.TestCase):
+    def runTest(self):
+        registry = HandleRegistry(idle_timeout=0)
+        handle, other = Handle(), Handle()
+        registry.register(handle, 'address', 'name')
+        registry.register(other, 'address', 'other')
+        registry.release(handle)
+        # Still registered until it expires, and reacquiring revives it
+        self.assertIs(handle, registry.acquire('name'))
+        registry.release(handle)
+        self.assertEqual([], registry.expired())
+        self.assertNotIn(handle, registry)
+        registry.release(other)
+        self.assertEqual(['address'], registry.expired())
+        self.assertEqual(0, len(registry))
+
+
+class HandleAbandonTestCase(unittest.TestCase):
+    def runTest(self):
+        registry = HandleRegistry(idle_timeout=0)
+        handle = Handle()
+        registry.register(handle, 'address', 'name')
+        del handle
+        gc.collect()
+        self.assertIsNone(registry.acquire('name'))
+        self.assertEqual(0, len(registry))
+        self.assertEqual(['address'], registry.expired())
+        self.assertEqual([], registry.expired())
+        registry = HandleRegistry()
+        handle = Handle()
+        registry.register(handle, 'address', 'name')
+        del handle
+        gc.collect()
+        self.assertEqual(0, len(registry))
+        self.assertEqual([], registry.expired())
+
+
+class SharedHandleTestCase(unittest.TestCase):
+    def runTest(self):
+        client = NodeClient()
+        db = client.db('kv')
+        self.assertIs(db, client.db('kv'))
+        self.assertIs(db, client.db(db.id))
+        self.assertEqual(['open'], client.calls)
+        uncached = client.db('kv', local_options={'use_db_cache': False})
+        self.assertIsNot(db, uncached)
+        self.assertTrue(db.cached)
+        self.assertFalse(uncached.cached)
+        self.assertIs(uncached, client.db('kv', local_options={'use_db_cache': False}))
+        with self.assertLogs(client.logger, level='WARNING'):
+            self.assertIs(db, client.db('kv', json={'create': True, 'type': 'keyvalue'}))
+        self.assertIsNot(db, NodeClient(reuse_dbs=False).db('kv'))
+
+
+
+class WriteAccessTestCase(unittest.TestCase):
+    def runTest(self):
+        client = NodeClient()
+        client.results['info'] = {'canAppend': False}
+        db = DB(client, kv_params(canAppend=False))
+        self.assertFalse(db.writable)
+        # Refused after asking the node again, before the write is sent or staged in the write cache
+        with self.assertRaises(WriteAccessError):
+            db.put({'key': 'k', 'value': 1})
+        with self.assertRaises(WriteAccessError):
+            db.remove('k')
+        self.assertEqual(['info', 'info'], client.calls)
+        self.assertEqual(0, db.pending_writes)
+        self.assertIsNone(db.cache_get('k'))
+        # Access granted after the open lets the next write through without a manual refresh
+        client.calls.clear()
+        client.results['info'] = {'canAppend': True}
+        db.put({'key': 'k', 'value': 1})
+        db.put({'key': 'k', 'value': 2})
+        self.assertTrue(db.writable)
+        self.assertEqual(['info', 'put', 'put'], client.calls)
+
+
+
+class CapabilityTestCase(unittest.TestCase):
+    def runTest(self):
+        self.assertEqual(CAP_GET | CAP_PUT, capability_mask(['get', 'put', 'unknown']))
+        self.assertEqual(0, capability_mask([]))
+        self.assertEqual(CAP_ADD, capability_mask(['add', 'add']))
+        client = NodeClient()
+        db = DB(client, kv_params())
+        with self.assertRaises(CapabilityError) as error:
+            db.add({'value': 1})
+        self.assertNotIsInstance(error.exception, WriteAccessError)
+        self.assertEqual('Db units does not have add capability', str(error.exception))
+        with self.assertRaisesRegex(CapabilityError, 'does not have iterator capability'):
+            db.iterator(limit=1)
+        self.assertEqual([], client.calls)
+        # Unenforced capabilities are left to the node
+        DB(client, kv_params(), enforce_caps=False).add({'value': 1})
+        self.assertEqual(['add'], client.calls)
+
+
+class UncheckedWriteAccessTestCase(unittest.TestCase):
+    def runTest(self):
+        client = NodeClient()
+        db = DB(client, kv_params(canAppend=False), check_write_access=False)
+        self.assertFalse(db.writable)
+        db.put({'key': 'k', 'value': 1})
+        db.remove('k')
+        self.assertEqual(['put', 'remove'], client.calls)
+
+
+class IdleUnloadTestCase(unittest.TestCase):
+    def runTest(self):
+        client = NodeClient(db_idle_timeout=0)
+        db = client.db('kv')
+        address = db.id
+        db.close()
+        self.assertEqual([address], client.unload_idle())
+        self.assertEqual(['open', 'unload'], client.calls)
+        client.calls.clear()
+        # Dropped without close() the db is unloaded all the same
+        db = client.db('kv')
+        del db
+        gc.collect()
+        self.assertEqual([address], client.unload_idle())
+        self.assertEqual(['open', 'unload'], client.calls)
+
+
+class EntryViewTestCase(unittest.TestCase):
+    def runTest(self):
+        log = [
+            {'hash': 'zdpuB', 'payload': {'op': 'ADD', 'value': {'hash': 'zdpuX', 'text': '}]"{[\\'}}, 'clock': {'id': 'b', 'time': 2}},
+            {'payload': {'value': [{'hash': 'zdpuY'}]}, 'hash': 'zdpuA', 'clock': {'id': 'a', 'time': 1}},
+            {'hash': 'zdpuC', 'payload': {'value': None}, 'clock': {'id': 'a', 'time': 2}}
+        ]
+        for separators in ((',', ':'), (', ', ': ')):
+            entries = split_entries(json.dumps(log, separators=separators).encode())
+            self.assertEqual(['zdpuB', 'zdpuA', 'zdpuC'], [entry.hash for entry in entries])
+            self.assertFalse(any(entry.parsed for entry in entries))
+            self.assertEqual(log[0]['payload']['value'], entries[0].value)
+            self.assertEqual(log, [entry.data for entry in entries])
+        self.assertEqual([], split_entries(b'[]'))
+        b, a, c = entries
+        self.assertEqual([a, c, b], sorted(entries))
+        self.assertTrue(a <= b and b >= a and a < b and b > a)
+        self.assertEqual(a, Entry(json.dumps(log[1]).encode()))
+        self.assertEqual({a, b, c}, {Entry(entry) for entry in log})
+        self.assertEqual((2, 'b'), b.clock)
+        with self.assertRaises(AttributeError):
+            a.extra = 1
+        # Ordering uses the clock taken during the scan, the entries stay undecoded
+        entries = split_entries(json.dumps(log).encode())
+        self.assertEqual(['zdpuA', 'zdpuC', 'zdpuB'], [entry.hash for entry in sorted(entries)])
+        self.assertEqual('zdpuB', max(entries).hash)
+        self.assertFalse(any(entry.parsed for entry in entries))
+        # A hash or clock that is not a string or an object is left to the full parse
+        entry, = split_entries(b'[{"hash": null, "id": "x", "clock": null}]')
+        self.assertIsNone(entry.hash)
+        self.assertEqual((0, None), entry.clock)
+        self.assertNotEqual(entry, Entry({'hash': 'id'}))
+
+
+class SnapshotFileTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, 'log.jsonl')
+
+    def runTest(self):
+        entries = [{'hash': f'h{n}', 'clock': {'time': n}} for n in range(3)]
+        self.assertEqual(3, write_snapshot(self.path, {'head': 'h2'}, entries))
+        self.assertEqual(({'head': 'h2', 'version': 1}, entries), read_snapshot(self.path))
+        # A failing export leaves the previous snapshot and no temp file behind
+        def failing():
+            yield {'hash': 'h3'}
+            raise RuntimeError('interrupted')
+        with self.assertRaises(RuntimeError):
+            write_snapshot(self.path, {'head': 'h3'}, failing())
+        self.assertEqual(['log.jsonl'], os.listdir(self.dir.name))
+        self.assertEqual(entries, read_snapshot(self.path)[1])
+        open(self.path, 'wb').close()
+        with self.assertRaises(SnapshotError):
+            read_snapshot(self.path)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+
+
+
+class TraceRecorderTestCase(EventNodeTestCase):
+    def setUp(self):
+        super().setUp()
+        self.dir = tempfile.TemporaryDirectory()
+
+    def runTest(self):
+        self.server.values = {'a': 1}
+        path = os.path.join(self.dir.name, 'trace.jsonl')
+        client = OrbitDbAPI(base_url=self.base_url, trace=path)
+        db = client.db('kv', json={'create': True, 'type': 'keyvalue'})
+        item = {'key': 'k', 'value': 'v' * 100}
+        db.put(item)
+        db.get('a')
+        db.get('a')
+        db.get('a', cache=False)
+        client.close()
+        records = read_trace(path)
+        address = quote(db.id, safe='')
+        self.assertEqual(
+            [('POST', 'db/kv', None), ('POST', f'db/{address}/put', None), ('GET', f'db/{address}/a', 'miss'),
+             ('GET', f'db/{address}/a', 'hit'), ('GET', f'db/{address}/a', None)],
+            [(record.method, record.endpoint, record.cache) for record in records]
+        )
+        opened, put, miss, hit, uncached = records
+        # Options are kept for replay, write payloads only by size
+        self.assertEqual({'create': True, 'type': 'keyvalue'}, opened.body)
+        self.assertIsNone(put.body)
+        self.assertEqual(payload_size({'json': item}), put.size)
+        self.assertEqual(0.0, hit.latency)
+        self.assertTrue(all(record.offset >= 0 and record.latency >= 0 for record in records))
+        self.assertEqual([True, True, True, False, True], [replayable(record) for record in records])
+
+    def tearDown(self):
+        self.dir.cleanup()
+        super().tearDown()
+
+
+class ReplayKwargsTestCase(unittest.TestCase):
+    def runTest(self):
+        record = TraceRecord(0, 'POST', 'db/kv', 20, 0.1, None, {'create': True})
+        self.assertEqual({'json': {'create': True}}, replay_kwargs(record, 0))
+        self.assertEqual({}, replay_kwargs(record._replace(method='GET', size=0, body=None), 0))
+        self.assertEqual({'json': {'val': 1}}, replay_kwargs(record._replace(endpoint='db/counter/inc', body=None), 0))
+        padded = replay_kwargs(record._replace(endpoint='db/kv/put', size=200, body=None), 3)['json']
+        self.assertEqual('replay-3', padded['key'])
+        self.assertEqual(padded['key'], padded['_id'])
+        self.assertAlmostEqual(200, payload_size({'json': padded}), delta=20)
+        self.assertFalse(replayable(record._replace(endpoint='db/kv/events/write')))
+
+
+
+class SnapshotCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, 'kv.jsonl')
+
+    def runTest(self):
+        client = NodeClient()
+        client.results['all'] = {'a': 1, 'b': 2}
+        DB(client, kv_params()).export_snapshot(self.path)
+        # Snapshot values could be stale, get() only serves them when asked to
+        db = DB(client, kv_params())
+        self.assertEqual({'a': 1, 'b': 2}, db.load_snapshot(self.path))
+        self.assertIsNone(db.cache_get('a'))
+        db.load_snapshot(self.path, cache=True)
+        self.assertEqual(1, db.cache_get('a'))
+        # Log entries never change, they warm the cache by default
+        log = DB(client, kv_params(type='eventlog', capabilities=['add', 'get', 'iterator']))
+        client.results['iterator'] = [{'hash': 'zdpuA', 'clock': {'time': 1}}]
+        log.export_snapshot(self.path)
+        client.results['iterator'] = [{'hash': 'zdpuB', 'clock': {'time': 2}}]
+        self.assertEqual(['zdpuA', 'zdpuB'], [entry['hash'] for entry in log.load_snapshot(self.path)])
+        self.assertEqual({'hash': 'zdpuB', 'clock': {'time': 2}}, log.cache_get('zdpuB'))
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+
+class CliParserTestCase(unittest.TestCase):
+    def runTest(self):
+        args = parser().parse_args(['--base-url', base_url, 'replay', '--speed', '0', '--async', 'trace.jsonl'])
+        self.assertEqual(('replay', 'trace.jsonl', 0, True), (args.command, args.trace, args.speed, args.use_async))
+        args = parser().parse_args(['bench', 'kv', '--type', 'keyvalue', '--ops', '10'])
+        self.assertEqual(('kv', {'json': {'create': True, 'type': 'keyvalue'}}, 10), (args.dbname, open_options(args), args.ops))
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out), self.assertRaises(SystemExit) as exit:
+            parser().parse_args(['replay', '--help'])
+        self.assertEqual(0, exit.exception.code)
+        self.assertIn('--speed', out.getvalue())
+
+
+class CliHelpersTestCase(unittest.TestCase):
+    def runTest(self):
+        self.assertEqual(0, percentile([], 50))
+        ordered = list(range(101))
+        self.assertEqual((0, 50, 99, 100), tuple(percentile(ordered, pct) for pct in (0, 50, 99, 100)))
+        async def run():
+            limiter = RateLimiter(20)
+            started = time.monotonic()
+            for _c in range(5):
+                await limiter.wait()
+            return time.monotonic() - started
+        self.assertGreaterEqual(asyncio.run(run()), 0.19)
+
+
+class CliRunTestCase(EventNodeTestCase):
+    def setUp(self):
+        super().setUp()
+        self.dir = tempfile.TemporaryDirectory()
+
+    def runTest(self):
+        dump = os.path.join(self.dir.name, 'dump.json')
+        with contextlib.redirect_stdout(io.StringIO()), self.assertRaises(SystemExit) as exit:
+            main(['--base-url', self.base_url, 'dump', 'kv', dump])
+        self.assertEqual(0, exit.exception.code)
+        with open(dump) as fp:
+            self.assertEqual([], json.load(fp))
+        trace = os.path.join(self.dir.name, 'trace.jsonl')
+        with open(trace, 'w') as fp:
+            fp.write('[0,"POST","db/kv",0,0.01,null,{"create":true}]\n[0.01,"GET","db/kv/all",0,0.01,null,null]\n')
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            main(['--base-url', self.base_url, 'replay', '--speed', '0', trace])
+        summary = json.loads(out.getvalue())
+        self.assertEqual({'POST db/kv', 'GET db/kv/all'}, set(summary))
+        self.assertEqual([0, 0], [endpoint['errors'] for endpoint in summary.values()])
+
+    def tearDown(self):
+        self.dir.cleanup()
+        super().tearDown()
+
+
+
+class CompressBodyTestCase(unittest.TestCase):
+    def runTest(self):
+        self.assertEqual({'params': {'limit': 1}}, compress_body({'params': {'limit': 1}}, 10))
+        small = compress_body({'json': {'key': 'k'}}, 1024)
+        self.assertEqual(b'{"key": "k"}', small['data'])
+        self.assertNotIn('content-encoding', small['headers'])
+        item = {'key': 'k', 'value': 'v' * 2048}
+        large = compress_body({'json': item, 'headers': {'x-test': '1'}}, 1024)
+        self.assertEqual({'x-test': '1', 'content-type': 'application/json', 'content-encoding': 'gzip'}, large['headers'])
+        self.assertLess(len(large['data']), 1024)
+        self.assertEqual(item, json.loads(gzip.decompress(large['data'])))
+
+
+class AcceptEncodingTestCase(unittest.TestCase):
+    def runTest(self):
+        decoders = dict(SUPPORTED_DECODERS)
+        encodings = accept_encoding().split(', ')
+        self.assertEqual(decoders, SUPPORTED_DECODERS)
+        self.assertEqual([encoding for encoding in encodings if encoding in decoders], encodings)
+        self.assertIn('gzip', encodings)
+        self.assertLess(encodings.index('gzip'), encodings.index('deflate'))
+        self.assertEqual(accept_encoding(), AsyncOrbitDbAPI(base_url=base_url).raw_client.headers['accept-encoding'])
+        self.assertEqual('identity', AsyncOrbitDbAPI(base_url=base_url, compress_responses=False).raw_client.headers['accept-encoding'])
+
+
+class LazyImportTestCase(unittest.TestCase):
+    def runTest(self):
+        # The clients load httpx and the compression module when the first one is built, not on import
+        code = 'import sys, orbitdbapi.client, orbitdbapi.asyncClient; print(sorted({"httpx", "orbitdbapi.compression"} & set(sys.modules)))'
+        output = subprocess.run(
+            [sys.executable, '-c', code], cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            capture_output=True, text=True, check=True
+        ).stdout
+        self.assertEqual('[]', output.strip())
+
+
+class CompressRequestsTestCase(unittest.TestCase):
+    def runTest(self):
+        item = {'json': {'key': 'k', 'value': 'v' * 64}}
+        self.assertIs(item, NodeClient()._encode_body(item))
+        encoded = NodeClient(compress_requests=True, compress_min_size=16)._encode_body(item)
+        self.assertEqual('gzip', encoded['headers']['content-encoding'])
+        self.assertNotIn('content-encoding', NodeClient(compress_requests=True)._encode_body(item)['headers'])
+
+
+if __name__ == '__main__':
+    unittest.main()